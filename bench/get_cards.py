@@ -0,0 +1,93 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+"""
+Latency of card.get_cards against a local stub of the search API, sequential versus concurrent.
+
+    python3 bench/get_cards.py [--latency 0.05] [--jitter 0.05] [--iterations 50]
+"""
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import statistics
+import sys
+from threading import Thread
+import time
+from urllib.parse import parse_qs, quote_plus, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import httpx  # noqa: E402
+
+from card import get_cards  # noqa: E402
+
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+    jitter = 0.05
+
+    def do_GET(self) -> None:
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        name = parse_qs(urlparse(self.path).query)["name"][0]
+        body = json.dumps({"name": {"en": name}, "konami_id": None}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def get_cards_sequential(client: httpx.Client, names):
+    """The implementation before concurrent lookups, as the baseline."""
+    responses = [
+        client.get(f"{os.getenv('API_URL')}/ocg-tcg/search?name={quote_plus(name)}")
+        for name in names
+    ]
+    return [response.json() for response in responses if response.status_code == 200]
+
+
+def percentile(samples, p: float) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    StubSearchHandler.latency = args.latency
+    StubSearchHandler.jitter = args.jitter
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSearchHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["API_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print("summons | implementation | p50 ms | p99 ms")
+    with httpx.Client() as client:
+        for count in range(1, 6):
+            for label, implementation in [
+                ("sequential", get_cards_sequential),
+                ("concurrent", get_cards),
+            ]:
+                samples = []
+                for i in range(args.iterations):
+                    names = [f"card {i} {j}" for j in range(count)]
+                    start = time.perf_counter()
+                    cards = implementation(client, names)
+                    samples.append((time.perf_counter() - start) * 1000)
+                    assert [card["name"]["en"] for card in cards] == names
+                print(
+                    f"{count} | {label} | {percentile(samples, 50):.1f} | {percentile(samples, 99):.1f}"
+                )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+"""
+Build time and lookup cost of the local card index, over a bulk dump or a synthetic one padded
+out from bench/cards.json to a realistic size.
+
+    python3 bench/index.py [--dump cards.json] [--size 13000] [--number 2000]
+"""
+
+from argparse import ArgumentParser
+import copy
+import json
+import os
+import random
+import re
+import sys
+import time
+from timeit import Timer
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from card_index import CardIndex, UpdatingCardIndex  # noqa: E402
+
+
+def synthetic(cards, size: int, seed: int = 0):
+    """
+    Real cards plus made-up ones, named with a few words drawn with a skewed distribution from a
+    vocabulary of the words in the real cards and invented ones, like the names in the game.
+    """
+    rng = random.Random(seed)
+    words = sorted(
+        {
+            word
+            for card in cards
+            for word in re.findall(
+                r"[A-Za-z]{3,}", f"{card['name']['en']} {card['text']['en']}"
+            )
+        }
+    )
+    while len(words) < 4000:
+        invented = "".join(
+            rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(3, 9))
+        )
+        words.append(invented.capitalize())
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    rng.shuffle(words)
+    dump = list(cards)
+    names = {card["name"]["en"] for card in cards}
+    while len(dump) < size:
+        name = " ".join(rng.choices(words, weights, k=rng.randint(2, 4)))
+        if name in names:
+            continue
+        names.add(name)
+        card = copy.deepcopy(rng.choice(cards))
+        card["name"] = {"en": name}
+        card["konami_id"] = card["password"] = None
+        dump.append(card)
+    return dump
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--dump")
+    parser.add_argument("--size", type=int, default=13000)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+    with open(os.path.join(os.path.dirname(__file__), "cards.json")) as f:
+        cards = json.load(f)
+    if args.dump:
+        with open(args.dump) as f:
+            dump = json.load(f)
+    else:
+        dump = synthetic(cards, args.size)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = CardIndex(dump)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    print(f"built index of {len(index)} cards in {elapsed:.2f}s, {memory:.1f} MiB")
+
+    queries = {
+        "exact": "dark magician",
+        "punctuation": "ash blossom and joyous spring",
+        "typo": "odd eyes pendulm dragon",
+        "partial": "decode",
+        "unknown": "not a real card at all",
+    }
+    print("query | µs | confident | fallback")
+    for label, query in queries.items():
+        number = args.number // 10 if label != "exact" else args.number
+
+        def lookup(query=query):
+            return index.exact(query) or index.fuzzy(
+                query, UpdatingCardIndex.THRESHOLD, UpdatingCardIndex.MARGIN
+            )
+
+        seconds = min(Timer(lookup).repeat(repeat=3, number=number)) / number
+        confident = lookup()
+        fallback = index.fuzzy(query, UpdatingCardIndex.FALLBACK_THRESHOLD, 0)
+        print(
+            f"{label} [{query}] | {seconds * 1e6:.1f} | "
+            f"{confident and confident['name']['en']} | {fallback and fallback['name']['en']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+"""
+Render cost per card over a corpus of card JSON, uncached versus memoized.
+
+    python3 bench/render.py [--corpus bench/cards.json] [--number 2000]
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import sys
+from timeit import Timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from card import generate_card_display, render_card_display  # noqa: E402
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--corpus", default=os.path.join(os.path.dirname(__file__), "cards.json")
+    )
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+    with open(args.corpus) as f:
+        cards = json.load(f)
+
+    print("card | uncached µs | memoized µs")
+    totals = [0.0, 0.0]
+    for card in cards:
+        generate_card_display(card)
+        results = []
+        for i, render in enumerate([render_card_display, generate_card_display]):
+            seconds = min(
+                Timer(lambda render=render, card=card: render(card)).repeat(
+                    repeat=5, number=args.number
+                )
+            )
+            results.append(seconds / args.number * 1e6)
+            totals[i] += results[-1]
+        print(f"{card['name']['en']} | {results[0]:.2f} | {results[1]:.2f}")
+    print(
+        f"mean | {totals[0] / len(cards):.2f} | {totals[1] / len(cards):.2f}",
+    )
+
+
+if __name__ == "__main__":
+    main()
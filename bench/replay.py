@@ -0,0 +1,533 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+"""
+Replays a recording of submissions, comments and mentions through the real SubmissionsThread,
+CommentsThread and MentionsThread, with the pipeline, reply sender and store, against an in-memory
+stand-in for Reddit and a local stub of the card search API. Reports throughput, reply latency,
+API calls per item and memory growth.
+
+    python3 bench/replay.py [--recording recording.json] [--comments 2000] [--latency 0.05]
+        [--reddit-latency 0.01]
+
+Without --recording, a deterministic synthetic recording is generated from --seed, summoning the
+cards in bench/cards.json; --save writes it out for reuse. A recording is JSON of the form
+
+    {"me": "BastionBotYuGiOh",
+     "submissions": [{"id", "author", "selftext", "created_utc"}],
+     "comments": [{"id", "author", "body", "created_utc", "link_id", "parent_id"}],
+     "mentions": [{"id", "author", "body", "created_utc", "link_id", "parent_id", "subreddit"}]}
+
+Comment forests are rebuilt from parent_id, so recorded replies by the bot exercise the dedup checks.
+--trace writes spans for every item to a Chrome Trace Event file, to check the tracing overhead.
+"""
+
+from argparse import ArgumentParser
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+from threading import Lock, Thread
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, ClassVar, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import httpx  # noqa: E402
+
+from card import may_have_summons  # noqa: E402
+from mention import MentionsThread  # noqa: E402
+from pipeline import Pipeline, stage_latency  # noqa: E402
+from profiling import tracer  # noqa: E402
+from ratelimit import RateBudget  # noqa: E402
+from reply_history import ReplyHistoryScanner  # noqa: E402
+from reply_queue import ReplySender  # noqa: E402
+from store import Store  # noqa: E402
+from stream import CommentsThread, SubmissionsThread  # noqa: E402
+
+SUBREDDIT = "bastionbot"
+
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+    jitter = 0.05
+    cards: ClassVar[Dict[str, Any]] = {}
+    requests = 0
+    lock = Lock()
+
+    def do_GET(self) -> None:
+        with self.lock:
+            StubSearchHandler.requests += 1
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        name = parse_qs(urlparse(self.path).query)["name"][0]
+        card = self.cards.get(name.lower())
+        body = json.dumps(card).encode() if card else b"{}"
+        self.send_response(200 if card else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class FakeSubmission:
+    def __init__(self, reddit: "FakeReddit", data: Dict[str, Any]) -> None:
+        self._reddit = reddit
+        self.id = data["id"]
+        self.fullname = f"t3_{self.id}"
+        self.author = SimpleNamespace(name=data["author"]) if data["author"] else None
+        self.selftext = data.get("selftext", "")
+        self.created_utc = data["created_utc"]
+        self.subreddit = SimpleNamespace(display_name=data.get("subreddit", SUBREDDIT))
+        self.permalink = f"/r/{self.subreddit.display_name}/comments/{self.id}/"
+
+    @property
+    def comments(self) -> List["FakeComment"]:
+        self._reddit.call("comments")
+        return self._reddit.children(self.fullname)
+
+    def reply(self, text: str) -> "FakeComment":
+        return self._reddit.post_reply(self, text)
+
+
+class FakeComment:
+    def __init__(self, reddit: "FakeReddit", data: Dict[str, Any]) -> None:
+        self._reddit = reddit
+        self.id = data["id"]
+        self.fullname = f"t1_{self.id}"
+        self.author = SimpleNamespace(name=data["author"]) if data["author"] else None
+        self.body = data["body"]
+        self.created_utc = data["created_utc"]
+        self.parent_id = data["parent_id"]
+        self.link_id = data["link_id"]
+        self.is_root = self.parent_id == self.link_id
+        self.subreddit = SimpleNamespace(display_name=data.get("subreddit", SUBREDDIT))
+        self.permalink = (
+            f"/r/{self.subreddit.display_name}/comments/{self.link_id[3:]}/_/{self.id}/"
+        )
+        self.context = f"{self.permalink}?context=3"
+        self.new = True
+        self.replies: List[FakeComment] = []
+
+    @property
+    def submission(self) -> FakeSubmission:
+        return self._reddit.things[self.link_id]
+
+    def parent(self) -> "FakeComment | FakeSubmission":
+        self._reddit.call("parent")
+        return self._reddit.things[self.parent_id]
+
+    def refresh(self) -> None:
+        self._reddit.call("refresh")
+        self.replies = self._reddit.children(self.fullname)
+
+    def reply(self, text: str) -> "FakeComment":
+        return self._reddit.post_reply(self, text)
+
+    def mark_read(self) -> None:
+        self._reddit.call("mark_read")
+        self.new = False
+
+    def disable_inbox_replies(self) -> None:
+        self._reddit.call("disable_inbox_replies")
+
+
+class FakeListing:
+    """Releases the next batch of the recording on every request, like new posts arriving."""
+
+    def __init__(self, reddit: "FakeReddit", items: List[Any], batch: int) -> None:
+        self._reddit = reddit
+        self._items = items
+        self._batch = batch
+        self._released = 0
+
+    @property
+    def drained(self) -> bool:
+        return self._released >= len(self._items)
+
+    def __call__(self, limit: int = 100, params: Dict[str, Any] | None = None):
+        # A generator, so that like PRAW's ListingGenerator nothing is requested until iterated
+        self._reddit.call("listing")
+        time.sleep(self._reddit.latency)
+        now = time.perf_counter()
+        start, self._released = (
+            self._released,
+            min(self._released + self._batch, len(self._items)),
+        )
+        for item in self._items[start : self._released]:
+            self._reddit.released[item.fullname] = now
+        # Newest first, as Reddit returns listings
+        yield from reversed(
+            self._items[max(0, self._released - limit) : self._released]
+        )
+
+
+class FakeReddit:
+    def __init__(self, recording: Dict[str, Any], batch: int, latency: float) -> None:
+        self._lock = Lock()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.me = recording["me"]
+        self.auth = SimpleNamespace(limits={})
+        self.config = SimpleNamespace(kinds={"comment": "t1", "submission": "t3"})
+        self.user = SimpleNamespace(me=self._me)
+        self.things: Dict[str, Any] = {}
+        self._children: Dict[str, List[FakeComment]] = {}
+        self.released: Dict[str, float] = {}
+        self.reply_latencies: List[float] = []
+        self._replies = 0
+        submissions = [FakeSubmission(self, data) for data in recording["submissions"]]
+        comments = [FakeComment(self, data) for data in recording["comments"]]
+        mentions = [FakeComment(self, data) for data in recording["mentions"]]
+        # Replayed as if live, so that every item is within the reply history the store holds
+        recorded = submissions + comments + mentions
+        offset = time.time() - max(thing.created_utc for thing in recorded)
+        for thing in recorded:
+            thing.created_utc += offset
+            self._add(thing)
+        # Submissions in other subreddits, hosting mentions, are not part of the recording
+        for comment in comments + mentions:
+            if comment.link_id not in self.things:
+                self._add(
+                    FakeSubmission(
+                        self,
+                        {
+                            "id": comment.link_id[3:],
+                            "author": None,
+                            "created_utc": comment.created_utc,
+                            "subreddit": comment.subreddit.display_name,
+                        },
+                    )
+                )
+        # Mentions in the streamed subreddit also appear in its comment stream
+        streamed = sorted(
+            comments
+            + [
+                mention
+                for mention in mentions
+                if mention.subreddit.display_name.lower() == SUBREDDIT
+            ],
+            key=lambda comment: comment.created_utc,
+        )
+        self._subreddit = SimpleNamespace(
+            new=FakeListing(self, submissions, batch),
+            comments=FakeListing(self, streamed, batch),
+        )
+        self.inbox = SimpleNamespace(
+            mentions=FakeListing(self, mentions, batch), mark_read=self._mark_read
+        )
+        self.listings = [
+            self._subreddit.new,
+            self._subreddit.comments,
+            self.inbox.mentions,
+        ]
+        self.recorded = [thing.id for thing in submissions + comments + mentions]
+        self.rejected = sum(
+            not may_have_summons(getattr(thing, "selftext", None) or thing.body)
+            for thing in submissions + streamed
+        )
+        # Items without summons are rejected unrecorded, so only the rest can be waited on.
+        # Mentions with summons in the streamed subreddit are left to the comment stream
+        self.expected = list(
+            dict.fromkeys(
+                [
+                    thing.fullname
+                    for thing in submissions + streamed
+                    if may_have_summons(getattr(thing, "selftext", None) or thing.body)
+                ]
+                + [
+                    mention.fullname
+                    for mention in mentions
+                    if mention.subreddit.display_name.lower() != SUBREDDIT
+                    or not may_have_summons(mention.body)
+                ]
+            )
+        )
+
+    def _add(self, thing: Any) -> None:
+        self.things[thing.fullname] = thing
+        if isinstance(thing, FakeComment):
+            self._children.setdefault(thing.parent_id, []).append(thing)
+
+    def _me(self) -> SimpleNamespace:
+        self.call("me")
+        return SimpleNamespace(
+            name=self.me, comments=SimpleNamespace(new=self._my_comments)
+        )
+
+    def _my_comments(self, limit: int = 100):
+        with self._lock:
+            mine = [
+                thing
+                for thing in self.things.values()
+                if isinstance(thing, FakeComment)
+                and thing.author
+                and thing.author.name == self.me
+            ]
+        mine.sort(key=lambda comment: comment.created_utc, reverse=True)
+        for i, comment in enumerate(mine[:limit]):
+            if i % 100 == 0:
+                self.call("history")
+            yield comment
+
+    def call(self, kind: str) -> None:
+        with self._lock:
+            self.calls[kind] += 1
+
+    def children(self, fullname: str) -> List[FakeComment]:
+        with self._lock:
+            return list(self._children.get(fullname, []))
+
+    def _mark_read(self, items: List[FakeComment]) -> None:
+        for i in range(0, len(items), 25):
+            self.call("mark_read")
+        for item in items:
+            item.new = False
+
+    def info(self, fullnames: List[str]) -> List[Any]:
+        for i in range(0, len(fullnames), 100):
+            self.call("info")
+        return [self.things[fullname] for fullname in fullnames]
+
+    def subreddit(self, name: str) -> SimpleNamespace:
+        return self._subreddit
+
+    def submission(self, id: str) -> FakeSubmission:
+        return self.things[f"t3_{id}"]
+
+    def comment(self, id: str) -> FakeComment:
+        return self.things[f"t1_{id}"]
+
+    def post_reply(self, target: Any, text: str) -> FakeComment:
+        self.call("reply")
+        with self._lock:
+            self._replies += 1
+            reply = FakeComment(
+                self,
+                {
+                    "id": f"reply{self._replies}",
+                    "author": self.me,
+                    "body": text,
+                    "created_utc": time.time(),
+                    "parent_id": target.fullname,
+                    "link_id": getattr(target, "link_id", target.fullname),
+                },
+            )
+            self._add(reply)
+            if target.fullname in self.released:
+                self.reply_latencies.append(
+                    time.perf_counter() - self.released[target.fullname]
+                )
+        return reply
+
+
+def generate(
+    seed: int,
+    submissions: int,
+    comments: int,
+    mentions: int,
+    summon_rate: float,
+    names: List[str],
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    me = "BastionBotYuGiOh"
+    unknown = ["Not A Real Card", "Blue-Eyes Purple Dragon"]
+    start = 1_700_000_000
+
+    def text() -> str:
+        if rng.random() >= summon_rate:
+            return rng.choice(["Nice deck", "What does this do?", "Banned next list"])
+        summons = rng.sample(names + unknown, rng.randint(1, 3))
+        return " and ".join(f"{{{{{name}}}}}" for name in summons) + " in hand"
+
+    def author() -> str:
+        return me if rng.random() < 0.05 else f"user{rng.randrange(200)}"
+
+    recording: Dict[str, Any] = {"me": me, "submissions": [], "comments": []}
+    for i in range(submissions):
+        recording["submissions"].append(
+            {
+                "id": f"s{i}",
+                "author": author(),
+                "selftext": text(),
+                "created_utc": start + i,
+            }
+        )
+    for i in range(comments):
+        link_id = f"t3_s{rng.randrange(submissions)}"
+        siblings = [c for c in recording["comments"][-50:] if c["link_id"] == link_id]
+        parent_id = (
+            f"t1_{rng.choice(siblings)['id']}"
+            if siblings and rng.random() < 0.4
+            else link_id
+        )
+        recording["comments"].append(
+            {
+                "id": f"c{i}",
+                "author": author(),
+                "body": text(),
+                "created_utc": start + i,
+                "link_id": link_id,
+                "parent_id": parent_id,
+            }
+        )
+    recording["mentions"] = []
+    for i in range(mentions):
+        # Half reply to a recorded comment, so the summon chain check has a parent to look up
+        parent = rng.choice(recording["comments"]) if rng.random() < 0.5 else None
+        recording["mentions"].append(
+            {
+                "id": f"m{i}",
+                "author": f"user{rng.randrange(200)}",
+                "body": f"u/{me} {text()}",
+                "created_utc": start + i,
+                "link_id": parent["link_id"] if parent else f"t3_x{i}",
+                "parent_id": f"t1_{parent['id']}" if parent else f"t3_x{i}",
+                "subreddit": rng.choice(["yugioh", SUBREDDIT]),
+            }
+        )
+    return recording
+
+
+def percentile(samples: List[float], p: int) -> float:
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+class UnlimitedBudget(RateBudget):
+    """The real budget at a capacity that never waits, to measure the bot rather than the quota."""
+
+    CAPACITY = 10**9
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--recording")
+    parser.add_argument("--save")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--submissions", type=int, default=200)
+    parser.add_argument("--comments", type=int, default=2000)
+    parser.add_argument("--mentions", type=int, default=100)
+    parser.add_argument("--summon-rate", type=float, default=0.2)
+    parser.add_argument("--batch", type=int, default=25)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--reddit-latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--real-budget", action="store_true")
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--trace")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    with open(os.path.join(os.path.dirname(__file__), "cards.json")) as f:
+        cards = json.load(f)
+    StubSearchHandler.cards = {card["name"]["en"].lower(): card for card in cards}
+    StubSearchHandler.latency = args.latency
+    StubSearchHandler.jitter = args.jitter
+    if args.recording:
+        with open(args.recording) as f:
+            recording = json.load(f)
+    else:
+        recording = generate(
+            args.seed,
+            args.submissions,
+            args.comments,
+            args.mentions,
+            args.summon_rate,
+            [card["name"]["en"] for card in cards],
+        )
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(recording, f)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSearchHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["API_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["SUBREDDITS"] = SUBREDDIT
+
+    reddit = FakeReddit(recording, args.batch, args.reddit_latency)
+    directory = tempfile.mkdtemp()
+    store = Store(os.path.join(directory, "replay.sqlite3"))
+    budget = (RateBudget if args.real_budget else UnlimitedBudget)(reddit)
+
+    if args.trace:
+        tracer.configure(args.trace, 1)
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with httpx.Client() as api_client:
+        pipeline = Pipeline(workers=args.workers, maxsize=100, policy="block")
+        pipeline.start()
+        replies = ReplySender(reddit, budget, store)
+        replies.start()
+        ReplyHistoryScanner(reddit, budget, store).start()
+        thread_args = (api_client, reddit, budget, store, pipeline.queue, replies)
+        for thread in [
+            SubmissionsThread(*thread_args),
+            CommentsThread(*thread_args),
+            MentionsThread(*thread_args),
+        ]:
+            thread.daemon = True
+            thread.start()
+        remaining = list(reddit.expected)
+        deadline = start + args.timeout
+        while time.perf_counter() < deadline:
+            remaining = [
+                fullname for fullname in remaining if not store.is_processed(fullname)
+            ]
+            drained = all(listing.drained for listing in reddit.listings)
+            if drained and not remaining and not store.pending_reply_count():
+                break
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        pipeline.stop()
+        tracer.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    items = len(reddit.recorded)
+    processed = items - len(remaining)
+    print(f"rejected without summons: {reddit.rejected}")
+    latencies = [seconds * 1000 for seconds in reddit.reply_latencies]
+    print(f"items: {processed}/{items} in {elapsed:.2f}s, {processed / elapsed:.1f}/s")
+    print(
+        f"replies: {len(latencies)}, latency ms p50 {percentile(latencies, 50):.1f} "
+        f"p90 {percentile(latencies, 90):.1f} p99 {percentile(latencies, 99):.1f}"
+    )
+    reddit_calls = sum(reddit.calls.values())
+    print(
+        f"reddit calls per item: {reddit_calls / items:.2f} "
+        + " ".join(f"{kind}={count}" for kind, count in sorted(reddit.calls.items()))
+    )
+    print(f"card API calls per item: {StubSearchHandler.requests / items:.2f}")
+    print(f"max RSS growth: {(rss_after - rss_before) / 1024:.1f} MiB")
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        print(f"traced: {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB")
+    for stage, stats in stage_latency.stats().items():
+        print(
+            f"stage {stage}: n={stats['count']} mean {stats['mean'] * 1000:.2f} ms "
+            f"max {stats['max'] * 1000:.1f} ms"
+        )
+    server.shutdown()
+    if remaining:
+        sys.exit(f"Timed out with {len(remaining)} items unprocessed")
+
+
+if __name__ == "__main__":
+    main()
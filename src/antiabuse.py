@@ -1,28 +1,110 @@
 # SPDX-FileCopyrightText: © 2023–2024 Kevin Lu, Luna Brand
 # SPDX-Licence-Identifier: AGPL-3.0-or-later
-from typing import TYPE_CHECKING
+from functools import lru_cache
+from typing import Callable, Dict, Generator, Iterable, List, Set, TYPE_CHECKING
+
+from cache import TTLCache
+from card import may_have_summons
 
 if TYPE_CHECKING:
+    import praw
     from praw.models import Comment, Submission
     from praw.models.comment_forest import CommentForest
 
+    from store import Store
+
+
+@lru_cache(maxsize=None)
+def my_name(reddit: "praw.Reddit") -> str:
+    """The bot's username, resolved once per client."""
+    return reddit.user.me().name
+
+
+def is_author(comment: "Comment", name: str) -> bool:
+    return comment.author is not None and comment.author.name == name
+
 
 def is_author_me(comment: "Comment") -> bool:
-    return (
-        comment.author is not None
-        and comment.author.name == comment._reddit.user.me().name
-    )
+    return is_author(comment, my_name(comment._reddit))
 
 
-def is_summon_chain(comment: "Comment") -> bool:
+# How far up the comment tree to look for ourselves, enough for Bastion -> Bot A -> Bot B summons Bastion
+MAX_HOPS = 2
+# Fullname -> (author name, parent fullname, whether it may summon) of comments fetched by the walk
+_ancestors = TTLCache(maxsize=4096, ttl=60 * 60, negative_ttl=0)
+
+
+# Yields the fullnames to fetch, is sent the fetched comments and returns the chained parents
+SummonChainWalk = Generator[List[str], Iterable["Comment"], Set[str]]
+
+
+def walk_summon_chains(
+    me: str, store: "Store", parents: Iterable[str], hops: int = MAX_HOPS
+) -> SummonChainWalk:
     """
-    Returns True if the grandparent comment is authored by self, to prevent looping.
-    This is naïve and will not prevent loops with more intervening comments,
-    e.g. Bastion -> Bot A -> Bot B summons Bastion
+    Returns those of the parent fullnames with a comment by me within hops ancestors,
+    starting from the parent itself, to prevent looping. Walks only continue past comments that
+    summon too, like a bot echoing us, so people can still summon in replies to each other under
+    our comments. The tree is walked up breadth first.
+    Each level is answered from our recorded reply IDs, then from ancestors memoized from earlier
+    walks, and the remaining fullnames are yielded once per level for the caller to fetch, so
+    that both runtimes share the walk.
     """
-    if comment.is_root:
-        return False
-    return is_author_me(comment.parent())
+    chained: Set[str] = set()
+    # Ancestor fullname -> the parents whose walks have reached it
+    frontier: Dict[str, List[str]] = {}
+    for parent in parents:
+        frontier.setdefault(parent, []).append(parent)
+    for _ in range(hops):
+        # Walks end at the submission
+        frontier = {
+            fullname: origins
+            for fullname, origins in frontier.items()
+            if fullname.startswith("t1_")
+        }
+        unknown = []
+        for fullname, origins in frontier.items():
+            if store.is_my_reply(fullname):
+                chained.update(origins)
+            elif not _ancestors.lookup(fullname)[0]:
+                unknown.append(fullname)
+        if unknown:
+            for comment in (yield unknown):
+                author = comment.author and comment.author.name
+                _ancestors.put(
+                    comment.fullname,
+                    (author, comment.parent_id, may_have_summons(comment.body)),
+                )
+        next_frontier: Dict[str, List[str]] = {}
+        for fullname, origins in frontier.items():
+            origins = [origin for origin in origins if origin not in chained]
+            cached, ancestor = _ancestors.lookup(fullname)
+            if not origins or not cached:
+                continue
+            author, parent, summons = ancestor
+            if author == me:
+                chained.update(origins)
+            elif summons:
+                next_frontier.setdefault(parent, []).extend(origins)
+        frontier = next_frontier
+    return chained
+
+
+def summon_chains(
+    reddit: "praw.Reddit",
+    store: "Store",
+    parents: Iterable[str],
+    fetch: Callable[[List[str]], Iterable["Comment"]],
+    hops: int = MAX_HOPS,
+) -> Set[str]:
+    """walk_summon_chains, fetching each level with fetch."""
+    walk = walk_summon_chains(my_name(reddit), store, parents, hops)
+    try:
+        unknown = next(walk)
+        while True:
+            unknown = walk.send(fetch(unknown))
+    except StopIteration as stop:
+        return stop.value
 
 
 def is_my_reply_in_comments(replies: "CommentForest") -> bool:
@@ -0,0 +1,377 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import asyncio
+from contextlib import suppress
+from functools import partial
+import logging
+from math import ceil
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Set,
+    Union,
+    TYPE_CHECKING,
+)
+
+from asyncprawcore import AsyncPrawcoreException, Forbidden
+from asyncpraw.exceptions import RedditAPIException
+from asyncpraw.models.util import ExponentialCounter, stream_generator
+
+from antiabuse import is_author, walk_summon_chains
+from card import display_cards, get_cards_async, may_have_summons, summarize_cards
+from filters import (
+    MARK_READ_BATCH,
+    claim_mentions,
+    comment_summons,
+    replied_locally,
+    submission_summons,
+    unread_mentions,
+)
+from footer import INFO
+from logs import Lazy, SAMPLED, timestamp_to_iso
+from metrics import (
+    items_seen,
+    prefilter_rejected,
+    reply_seconds,
+    summons_parsed,
+    thread_exceptions,
+)
+from ratelimit import Priority
+from reply_queue import ReplyQueue
+from shard import shard_subreddits
+
+if TYPE_CHECKING:
+    import asyncpraw
+    from asyncpraw.models import Comment, Submission
+    import httpx
+
+    from ratelimit import RateBudget
+    from store import PendingReply, Store
+
+
+class AsyncReplySender(ReplyQueue):
+    """Sends queued replies for the asyncio runtime, with the same budget and retries."""
+
+    def __init__(
+        self, reddit: "asyncpraw.Reddit", budget: "RateBudget", store: "Store"
+    ) -> None:
+        super().__init__(budget, store)
+        self._reddit = reddit
+        self._queued = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._queued.set()
+
+    async def _resolve(self, fullname: str) -> Union["Comment", "Submission"]:
+        kind, id = fullname.split("_", 1)
+        if kind == self._reddit.config.kinds["submission"]:
+            return await self._reddit.submission(id, fetch=False)
+        return await self._reddit.comment(id, fetch=False)
+
+    async def _send(self, pending: "PendingReply") -> None:
+        if self._already_sent(pending):
+            return
+        target = await self._resolve(pending.target)
+        # Posting and disabling inbox replies. The budget blocks, so it waits off the event loop
+        await asyncio.to_thread(self._budget.acquire, Priority.REPLY, 2)
+        try:
+            with reply_seconds.time():
+                reply: "Comment | None" = await target.reply(pending.text)
+        except Forbidden as e:
+            self._forbidden(pending, e)
+            return
+        except RedditAPIException as e:
+            self._rejected(pending, e.items, e)
+            return
+        except AsyncPrawcoreException as e:
+            self._failed(pending, e)
+            return
+        self._posted(pending, None if reply is None else reply.fullname)
+        if reply is not None:
+            await reply.disable_inbox_replies()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                # Nothing yields between clearing and checking, so no notification is missed
+                self._queued.clear()
+                pending, delay = self._due()
+                if pending is None:
+                    if delay != 0:
+                        with suppress(TimeoutError):
+                            await asyncio.wait_for(self._queued.wait(), delay)
+                    continue
+                await self._send(pending)
+            except Exception as e:
+                self._logger.error("Exception in task", exc_info=e)
+                thread_exceptions.inc("replies")
+                await asyncio.sleep(self.BACKOFF)
+
+
+class AsyncBot:
+    """
+    Alternative runtime that runs the submission, comment and mention streams on one event loop.
+    Each item is processed in its own task, so a slow search does not hold up ingestion. Items
+    are filtered by the same helpers as the threaded runtime, with the same rate budget, reply
+    queue and local store; only the Reddit calls around them are asynchronous.
+    """
+
+    # Bulk request limit, https://www.reddit.com/dev/api#GET_api_info
+    INFO_BATCH = 100
+
+    def __init__(
+        self,
+        reddit: "asyncpraw.Reddit",
+        api_client: "httpx.AsyncClient",
+        budget: "RateBudget",
+        store: "Store",
+        replies: AsyncReplySender,
+        max_tasks: int = 32,
+    ) -> None:
+        self._logger = logging.getLogger("async")
+        self._reddit = reddit
+        self._client = api_client
+        self._budget = budget
+        self._store = store
+        self._replies = replies
+        # Resolved once when run starts
+        self._me = ""
+        # Bounds in-flight items; streams wait for a free slot
+        self._slots = asyncio.Semaphore(max_tasks)
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _acquire(self, priority: Priority, cost: int = 1) -> None:
+        # The budget blocks, so it waits off the event loop
+        await asyncio.to_thread(self._budget.acquire, priority, cost)
+
+    async def _info(self, fullnames: List[str]) -> List[Any]:
+        things = []
+        for i in range(0, len(fullnames), self.INFO_BATCH):
+            await self._acquire(Priority.DEDUP)
+            batch = fullnames[i : i + self.INFO_BATCH]
+            things.extend([thing async for thing in self._reddit.info(fullnames=batch)])
+        return things
+
+    async def _summon_chains(self, parents: Iterable[str]) -> Set[str]:
+        walk = walk_summon_chains(self._me, self._store, parents)
+        try:
+            unknown = next(walk)
+            while True:
+                unknown = walk.send(await self._info(unknown))
+        except StopIteration as stop:
+            return stop.value
+
+    async def _already_replied(
+        self,
+        post: Union["Comment", "Submission"],
+        check: Callable[[Any], Awaitable[bool]],
+    ) -> bool:
+        replied = replied_locally(self._store, post)
+        if replied is None:
+            await self._acquire(Priority.DEDUP)
+            replied = await check(post)
+        return replied
+
+    async def _already_replied_to_submission(self, submission: "Submission") -> bool:
+        await submission.load()
+        return any(is_author(reply, self._me) for reply in submission.comments)
+
+    async def _already_replied_to_comment(self, comment: "Comment") -> bool:
+        await comment.refresh()
+        return any(is_author(reply, self._me) for reply in comment.replies)
+
+    def _reply(
+        self, target: Union["Comment", "Submission"], text: str, *continuation: str
+    ) -> None:
+        self._replies.enqueue(target, text, *continuation)
+
+    async def _is_submission_duplicate(
+        self, submission: "Submission", logger: logging.Logger
+    ) -> bool:
+        if await self._already_replied(submission, self._already_replied_to_submission):
+            logger.info(f"{submission.id}: skip, already replied")
+            return True
+        return False
+
+    async def _is_comment_duplicate(
+        self, comment: "Comment", logger: logging.Logger
+    ) -> bool:
+        if await self._already_replied(comment, self._already_replied_to_comment):
+            logger.info(f"{comment.id}: skip, already replied")
+            return True
+        if await self._summon_chains([comment.parent_id]):
+            logger.info(f"{comment.id}: skip, parent comment is me")
+            return True
+        return False
+
+    async def _process_post(
+        self,
+        name: str,
+        parse: Callable[[Any, logging.Logger], List[str]],
+        is_duplicate: Callable[[Any, logging.Logger], Awaitable[bool]],
+        post: Union["Comment", "Submission"],
+    ) -> None:
+        logger = logging.getLogger(name)
+        logger.info(
+            "%s",
+            Lazy(
+                lambda: (
+                    f"{post.id}|{post.permalink}|{timestamp_to_iso(post.created_utc)}"
+                )
+            ),
+            extra=SAMPLED,
+        )
+        summons = parse(post, logger)
+        if len(summons) and await is_duplicate(post, logger):
+            summons = []
+        summons_parsed.inc(name, amount=len(summons))
+        if len(summons):
+            cards = await get_cards_async(self._client, summons)
+            logger.info(f"{post.id}| cards: {summarize_cards(cards)}")
+            if len(cards):
+                self._reply(post, *display_cards(cards))
+        self._store.mark_processed(post.fullname)
+
+    async def _process_submission(self, submission: "Submission") -> None:
+        await self._process_post(
+            "submissions",
+            submission_summons,
+            self._is_submission_duplicate,
+            submission,
+        )
+
+    async def _process_comment(self, comment: "Comment") -> None:
+        await self._process_post(
+            "comments",
+            lambda comment, logger: comment_summons(
+                self._store, comment, self._me, logger
+            ),
+            self._is_comment_duplicate,
+            comment,
+        )
+
+    async def _process_mentions(
+        self, batch: List["Comment"], logger: logging.Logger
+    ) -> None:
+        """Like MentionsThread, marks the batch read at once and walks summon chains together."""
+        unread = unread_mentions(batch, logger)
+        if not unread:
+            return
+        await self._acquire(Priority.DEDUP, ceil(len(unread) / MARK_READ_BATCH))
+        await self._reddit.inbox.mark_read(unread)
+        candidates = claim_mentions(self._store, unread, logger)
+        chains = await self._summon_chains(
+            comment.parent_id for comment, _ in candidates
+        )
+        for comment, summons in candidates:
+            if comment.parent_id in chains:
+                logger.info(f"{comment.id}: skip, parent comment is me")
+                continue
+            await self._spawn(partial(self._answer_mention, summons=summons), comment)
+
+    async def _answer_mention(self, comment: "Comment", summons: List[str]) -> None:
+        if not len(summons):
+            self._reply(comment, INFO)
+            return
+        cards = await get_cards_async(self._client, summons)
+        logging.getLogger("mentions").info(
+            f"{comment.id}| cards: {summarize_cards(cards)}"
+        )
+        self._reply(comment, *(display_cards(cards) if len(cards) else [INFO]))
+
+    async def _guarded(self, process: Callable[[Any], Awaitable[None]], post) -> None:
+        try:
+            await process(post)
+        except Exception as e:
+            self._logger.error(f"{post.id}: exception in task", exc_info=e)
+            thread_exceptions.inc("tasks")
+        finally:
+            self._slots.release()
+
+    async def _spawn(self, process: Callable[[Any], Awaitable[None]], post) -> None:
+        await self._slots.acquire()
+        task = asyncio.create_task(self._guarded(process, post))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _consume(
+        self,
+        name: str,
+        stream: Callable[[], AsyncIterator[Any]],
+        process: Callable[[Any], Awaitable[None]],
+        text: Callable[[Any], str],
+    ) -> None:
+        """Items whose text cannot hold a summon are rejected before anything else is read."""
+        logger = logging.getLogger(name)
+        while True:
+            logger.info("Starting")
+            try:
+                async for post in stream():
+                    items_seen.inc(name)
+                    if not may_have_summons(text(post)):
+                        prefilter_rejected.inc(name)
+                        continue
+                    if self._store.is_processed(post.fullname):
+                        logger.info("%s: skip, processed", post.id, extra=SAMPLED)
+                        continue
+                    await self._spawn(process, post)
+            except Exception as e:
+                logger.error("Exception in stream", exc_info=e)
+                thread_exceptions.inc(name)
+
+    async def _consume_mentions(self) -> None:
+        """
+        Mentions are handled in batches, flushed whenever a poll has nothing new or the batch is
+        full. pause_after=0 hands control back on those polls instead of sleeping, so back off here.
+        """
+        logger = logging.getLogger("mentions")
+        while True:
+            logger.info("Starting")
+            try:
+                counter = ExponentialCounter(max_counter=16)
+                batch: List["Comment"] = []
+                mentions = stream_generator(self._reddit.inbox.mentions, pause_after=0)
+                async for comment in mentions:
+                    if comment is not None:
+                        items_seen.inc("mentions")
+                        batch.append(comment)
+                        if len(batch) < MARK_READ_BATCH:
+                            continue
+                    if batch:
+                        await self._process_mentions(batch, logger)
+                        batch = []
+                        counter.reset()
+                    else:
+                        await asyncio.sleep(counter.counter())
+            except Exception as e:
+                logger.error("Exception in stream", exc_info=e)
+                thread_exceptions.inc("mentions")
+
+    async def run(self) -> None:
+        self._me = (await self._reddit.user.me()).name
+        # Note: if a mention qualifies as a comment or post reply, it will not show up in this listing
+        consumers = [self._replies.run(), self._consume_mentions()]
+        names = shard_subreddits()
+        if names:
+            subreddits = await self._reddit.subreddit(names)
+            consumers += [
+                self._consume(
+                    "submissions",
+                    subreddits.stream.submissions,
+                    self._process_submission,
+                    lambda submission: submission.selftext,
+                ),
+                self._consume(
+                    "comments",
+                    subreddits.stream.comments,
+                    self._process_comment,
+                    lambda comment: comment.body,
+                ),
+            ]
+        else:
+            self._logger.warning("No subreddits for this shard, only reading mentions")
+        await asyncio.gather(*consumers)
@@ -1,31 +1,167 @@
-# SPDX-FileCopyrightText: © 2023–2025 Kevin Lu, Luna Brand
+# SPDX-FileCopyrightText: © 2023–2026 Kevin Lu, Luna Brand
 # SPDX-Licence-Identifier: AGPL-3.0-or-later
+import asyncio
 import logging
+from os import getenv, path
+import signal
+from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
 
-from clients import get_api_client
-from limit_regulation import master_duel_limit_regulation, genesys_limit_regulation
-from mention import MentionsThread
-from stream import CommentsThread, SubmissionsThread
+from card_index import card_index
+from clients import get_api_client, get_reddit_client
+from limit_regulation import limit_regulation_scheduler
+from logs import configure_logging
+import metrics
+from profiling import profiler, tracer
+from startup import milestone, milestones
+from store import Store
+
+if TYPE_CHECKING:
+    import httpx
+
+_logger = logging.getLogger("bastion")
+
+
+def start_threads(api_client: "httpx.Client", store: Store) -> None:
+    from mention import MentionsThread
+    from pipeline import Pipeline
+    from ratelimit import RateBudget
+    from reply_history import ReplyHistoryScanner
+    from reply_queue import ReplySender
+    from shard import shard_count, shard_index, shard_subreddits
+    from stream import CommentsThread, SubmissionsThread
+
+    pipeline = Pipeline(
+        workers=int(getenv("WORKERS", "4")),
+        maxsize=int(getenv("QUEUE_SIZE", "100")),
+        policy=getenv("QUEUE_POLICY", "block"),
+    )
+    pipeline.start()
+    # One client and one rate limit budget for the whole process, a share of the account's
+    reddit = get_reddit_client()
+    budget = RateBudget(reddit, shard_count())
+    replies = ReplySender(reddit, budget, store)
+    replies.start()
+    # The reply history is shared through the store, so one shard scanning is enough
+    if shard_index() == 0:
+        ReplyHistoryScanner(
+            reddit, budget, store, float(getenv("REPLY_SCAN_INTERVAL", "600"))
+        ).start()
+    metrics.Collected(
+        "bastion_ratelimit_headroom",
+        "Reddit API requests the rate limit budget has available",
+        lambda: [((), budget.headroom())],
+    )
+    metrics.Collected(
+        "bastion_queue_depth",
+        "Items waiting for a worker",
+        lambda: [((), pipeline.queue.depth())],
+    )
+    metrics.Collected(
+        "bastion_queue_dropped_total",
+        "Items dropped because the work queue was full",
+        lambda: [((), pipeline.queue.dropped)],
+        type="counter",
+    )
+    metrics.Collected(
+        "bastion_pending_replies",
+        "Replies queued to be sent",
+        lambda: [((), store.pending_reply_count())],
+    )
+    args = (api_client, reddit, budget, store, pipeline.queue, replies)
+    if shard_subreddits():
+        SubmissionsThread(*args).start()
+        CommentsThread(*args).start()
+    else:
+        _logger.warning("No subreddits for this shard, only reading mentions")
+    # Every shard reads mentions, which are claimed in the shared store
+    MentionsThread(*args).start()
+    milestone("streams_started")
+
+
+async def run_async(store: Store) -> None:
+    from async_bot import AsyncBot, AsyncReplySender
+    from clients import get_async_api_client, get_async_reddit_client
+    from ratelimit import RateBudget
+    from reply_history import ReplyHistoryScanner
+    from shard import shard_count, shard_index
+
+    async with get_async_reddit_client() as reddit, get_async_api_client() as client:
+        metrics.Collected(
+            "bastion_ratelimit_remaining",
+            "Reddit API requests remaining in the window, from the last response",
+            lambda: [((), reddit.auth.limits.get("remaining") or 0)],
+        )
+        # Async PRAW records the same rate limit headers, so the budget works unchanged
+        budget = RateBudget(reddit, shard_count())
+        replies = AsyncReplySender(reddit, budget, store)
+        # Like the limit regulation scheduler, the reply history scanner stays on its own thread,
+        # with its own client, so the async runtime can deduplicate from the store too
+        if shard_index() == 0:
+            ReplyHistoryScanner(
+                get_reddit_client(),
+                budget,
+                store,
+                float(getenv("REPLY_SCAN_INTERVAL", "600")),
+            ).start()
+        milestone("streams_started")
+        await AsyncBot(reddit, client, budget, store, replies).run()
 
 
 def main():
-    logging.basicConfig(level=logging.INFO)
+    # Before anything reads the environment, so that .env configures logging too
     load_dotenv()
+    configure_logging()
+    metrics.Collected(
+        "bastion_startup_seconds",
+        "Seconds from startup to each milestone",
+        lambda: [((name,), seconds) for name, seconds in milestones().items()],
+        ("milestone",),
+    )
+    if getenv("TRACE_PATH"):
+        tracer.configure(
+            getenv("TRACE_PATH"), float(getenv("TRACE_SAMPLE_RATE", "0.01"))
+        )
+    database_path = getenv("DATABASE_PATH", "bastion.sqlite3")
+    # The database directory is writable even in the container, unlike the working directory
+    data_directory = path.dirname(path.abspath(database_path))
+    # kill -USR1 writes a profile of every thread to PROFILE_DIR
+    signal.signal(
+        signal.SIGUSR1,
+        lambda signum, frame: profiler.dump(
+            float(getenv("PROFILE_SECONDS", "30")),
+            getenv("PROFILE_DIR", data_directory),
+        ),
+    )
+    if getenv("METRICS_PORT"):
+        metrics.start_server(
+            getenv("METRICS_HOST", "127.0.0.1"), int(getenv("METRICS_PORT"))
+        )
     api_client = get_api_client()
-    master_duel_limit_regulation.set_client(api_client)
-    genesys_limit_regulation.set_client(api_client)
-    submissions_thread = SubmissionsThread(api_client)
-    comments_thread = CommentsThread(api_client)
-    mentions_thread = MentionsThread(api_client)
-    master_duel_limit_regulation.update(True)
-    master_duel_limit_regulation.start()
-    genesys_limit_regulation.update(True)
-    genesys_limit_regulation.start()
-    submissions_thread.start()
-    comments_thread.start()
-    mentions_thread.start()
+    limit_regulation_scheduler.set_client(api_client)
+    store = Store(database_path)
+    limit_regulation_scheduler.set_snapshot_directory(
+        getenv("SNAPSHOT_DIR", data_directory)
+    )
+    # Optional, since the dump is large; searches use the remote API until it is loaded
+    if getenv("CARD_INDEX_URL"):
+        card_index.configure(getenv("CARD_INDEX_URL"), api_client)
+        card_index.start()
+    # Fetches start in the background straight away, concurrently with the rest of startup
+    loaded = limit_regulation_scheduler.load()
+    limit_regulation_scheduler.start()
+    # With no snapshot to fall back on, give the fetches a bounded head start
+    deadline = float(getenv("WARMUP_DEADLINE", "10"))
+    if not loaded and not limit_regulation_scheduler.wait_updated(deadline):
+        _logger.warning(
+            f"Limit regulation not ready after {deadline}s, starting anyway"
+        )
+    # The limit regulation scheduler stays on its own thread in both runtimes
+    if getenv("RUNTIME") == "asyncio":
+        asyncio.run(run_async(store))
+    else:
+        start_threads(api_client, store)
 
 
 if __name__ == "__main__":
@@ -1,56 +1,91 @@
 # SPDX-FileCopyrightText: © 2023–2024 Kevin Lu, Luna Brand
 # SPDX-Licence-Identifier: AGPL-3.0-or-later
-from collections import Counter
-from datetime import datetime, timezone
 import logging
 from threading import Thread
-from typing import Union, TYPE_CHECKING
+from typing import Any, Callable, Iterable, List, Set, Union, TYPE_CHECKING
 
-from prawcore import Forbidden
-from praw.exceptions import RedditAPIException
-
-from clients import get_reddit_client
-from footer import FOOTER
+from antiabuse import summon_chains
+from metrics import thread_exceptions
+from pipeline import WorkItem, stage_latency
+from profiling import tracer
+from ratelimit import Priority
 
 
 if TYPE_CHECKING:
     import httpx
+    import praw
     from praw.models import Comment, Submission
 
+    from pipeline import WorkQueue
+    from ratelimit import RateBudget
+    from reply_queue import ReplySender
+    from store import Store
+
 
 class BotThread(Thread):
-    # https://github.com/DawnbrandBots/bastion-for-reddit/issues/13
-    MAX_REPLIES_PER_SUBMISSION = 10
+    # Bulk request limit, https://www.reddit.com/dev/api#GET_api_info
+    INFO_BATCH = 100
 
-    def __init__(self, api_client: "httpx.Client", *args, **kwargs) -> None:
+    def __init__(
+        self,
+        api_client: "httpx.Client",
+        reddit: "praw.Reddit",
+        budget: "RateBudget",
+        store: "Store",
+        work_queue: "WorkQueue",
+        replies: "ReplySender",
+        *args,
+        **kwargs,
+    ) -> None:
         super().__init__(*args, **kwargs)
         self._logger = logging.getLogger(self.name)
         self._client = api_client
-        self._reddit = get_reddit_client()
-        # Actually irrelevant for SubmissionsThread
-        self._reply_counter = Counter()
-
-    def _reply(self, target: Union["Comment", "Submission"], text: str) -> None:
-        try:
-            reply: "Comment" = target.reply(text)
-            self._logger.info(f"{target.id}: posted reply {reply.id}")
-            if hasattr(target, "submission"):
-                self._reply_counter[target.submission.id] += 1
-            reply.disable_inbox_replies()
-        except Forbidden as e:
-            self._logger.warning(f"{target.id}: reply forbidden", exc_info=e)
-        except RedditAPIException as e:
-            for item in e.items:
-                if item.error_type == "TOO_LONG":
-                    self._logger.warning(f"{target.id}: reply too long", exc_info=e)
-                    reply: "Comment" = target.reply(
-                        f"Sorry, the cards are too long to fit into one comment.{FOOTER}"
-                    )
-                    self._logger.info(f"{target.id}: posted error {reply.id}")
-                    self._reply_counter[target.submission.id] += 1
-                    reply.disable_inbox_replies()
-                    return
-            self._logger.error(f"{target.id}: reply failure", exc_info=e)
+        # Shared by all threads, with one view of the rate limit
+        self._reddit = reddit
+        self._budget = budget
+        self._store = store
+        self._queue = work_queue
+        self._replies = replies
+
+    def _polled(self, function: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Wraps a listing method for stream_generator so that each poll waits for quota. The listing
+        is lazy, so it is consumed here to time the request itself as the fetch stage.
+        """
+
+        def poll(**kwargs):
+            self._budget.acquire(Priority.POLL)
+            with tracer.item("poll", self.name), stage_latency.time("fetch"):
+                return list(function(**kwargs))
+
+        return poll
+
+    def _checked(self, check: Callable[[Any], bool], post: Any) -> bool:
+        """Runs a dedup or anti-abuse check that calls Reddit once quota allows."""
+        self._budget.acquire(Priority.DEDUP)
+        return check(post)
+
+    def _info(self, fullnames: List[str]) -> List[Any]:
+        """Fetches things by fullname in bulk, waiting for quota before each request."""
+        things = []
+        for i in range(0, len(fullnames), self.INFO_BATCH):
+            self._budget.acquire(Priority.DEDUP)
+            things.extend(
+                self._reddit.info(fullnames=fullnames[i : i + self.INFO_BATCH])
+            )
+        return things
+
+    def _summon_chains(self, parents: Iterable[str]) -> Set[str]:
+        return summon_chains(self._reddit, self._store, parents, self._info)
+
+    def _enqueue(self, post: Any, process: Callable[[Any], None]) -> None:
+        """Hands off post to the worker pool so this thread can keep reading its stream."""
+        self._queue.put(WorkItem(self.name, post, process))
+
+    def _reply(
+        self, target: Union["Comment", "Submission"], text: str, *continuation: str
+    ) -> None:
+        self._replies.enqueue(target, text, *continuation)
 
     def _run(self) -> None:
         raise NotImplementedError
@@ -62,7 +97,4 @@ class BotThread(Thread):
                 self._run()
             except Exception as e:
                 self._logger.error("Exception in thread", exc_info=e)
-
-
-def timestamp_to_iso(created_utc: float) -> str:
-    return datetime.fromtimestamp(created_utc, timezone.utc).isoformat()
+                thread_exceptions.inc(self.name)
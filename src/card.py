@@ -1,21 +1,52 @@
 # SPDX-FileCopyrightText: © 2023–2025 Kevin Lu, Luna Brand
 # SPDX-Licence-Identifier: AGPL-3.0-or-later
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import logging
 from os import getenv
 import re
-from typing import Any, List, Dict, TYPE_CHECKING
+from typing import Any, List, Dict, Tuple, TYPE_CHECKING
 from urllib.parse import quote_plus
 
+import httpx
+
+from cache import TTLCache
+from card_index import card_index
 from footer import FOOTER
+from metrics import Collected, Histogram
 from limit_regulation import master_duel_limit_regulation, genesys_limit_regulation
 
 
 if TYPE_CHECKING:
-    from httpx import Client
+    from httpx import AsyncClient, Client
 
 
 summon_regex = re.compile("{{([^}]+)}}")
 # TODO: https://github.com/DawnbrandBots/bastion-for-reddit/issues/12
 summon_limit = 5
+# Reddit rejects longer comments with TOO_LONG
+comment_limit = 10000
+card_separator = "\n\n----\n\n"
+# Seconds allowed for each search request and for the whole batch of summons
+search_timeout = 5
+search_deadline = 8
+
+logger = logging.getLogger(__name__)
+# Keyed by the normalized tokens from parse_summons. None records a search with no result
+search_cache = TTLCache(maxsize=2048, ttl=60 * 60, negative_ttl=5 * 60)
+
+get_cards_seconds = Histogram(
+    "bastion_get_cards_seconds", "Latency of looking up all cards summoned by an item"
+)
+# Shared by all threads; bounded so one busy stream cannot flood the API
+_search_executor = ThreadPoolExecutor(
+    max_workers=2 * summon_limit, thread_name_prefix="search"
+)
+
+
+def may_have_summons(text: str) -> bool:
+    """Cheap check that rules out almost all text before the regular expression is needed."""
+    return "{{" in text
 
 
 def parse_summons(text: str) -> List[str]:
@@ -24,6 +55,8 @@ def parse_summons(text: str) -> List[str]:
     stripping surrounding whitespace and ignoring blanks and case-insensitive repeats.
     Currently limited to `summon_limit` items.
     """
+    if not may_have_summons(text):
+        return []
     summons: List[str] = summon_regex.findall(text)
     summons = [summon.strip() for summon in summons]
     return list(dict.fromkeys(summon.lower() for summon in summons if summon))[
@@ -31,13 +64,106 @@ def parse_summons(text: str) -> List[str]:
     ]
 
 
-def get_cards(client: "Client", names: List[str]) -> List[Dict[str, Any]]:
-    # Could be parallelized, even in a synchronous context
-    responses = [
-        client.get(f"{getenv('API_URL')}/ocg-tcg/search?name={quote_plus(name)}")
-        for name in names
-    ]
-    return [response.json() for response in responses if response.status_code == 200]
+def search_url(name: str) -> str:
+    return f"{getenv('API_URL')}/ocg-tcg/search?name={quote_plus(name)}"
+
+
+def _cache_search_response(
+    name: str, response: httpx.Response
+) -> Dict[str, Any] | None:
+    if response.status_code == 404:
+        card = None
+    elif response.status_code == 200:
+        card = response.json() or None
+    else:
+        # Rate limits and server errors are transient, and other errors are ours, so not cached
+        logger.warning(f"Failed search [{name}]: {response.status_code}")
+        return card_index.fallback(name)
+    search_cache.put(name, card)
+    return card
+
+
+def search_card(client: "Client", name: str) -> Dict[str, Any] | None:
+    try:
+        response = client.get(search_url(name), timeout=search_timeout)
+    except httpx.HTTPError as e:
+        # Transient, so not cached
+        logger.warning(f"Failed search [{name}]: {e!r}")
+        return card_index.fallback(name)
+    return _cache_search_response(name, response)
+
+
+async def search_card_async(client: "AsyncClient", name: str) -> Dict[str, Any] | None:
+    try:
+        response = await client.get(search_url(name), timeout=search_timeout)
+    except httpx.HTTPError as e:
+        logger.warning(f"Failed search [{name}]: {e!r}")
+        return card_index.fallback(name)
+    return _cache_search_response(name, response)
+
+
+@get_cards_seconds.timed
+def get_cards(
+    client: "Client", names: List[str], deadline: float = search_deadline
+) -> List[Dict[str, Any]]:
+    """
+    Searches for all names concurrently, returning the cards found in the same order as names.
+    Names the local card index matches confidently skip the remote search, and results are
+    served from search_cache where possible. Searches that fail or do not finish within the
+    deadline fall back to the best match in the index, if any, and are otherwise left out.
+    """
+    results: List[Dict[str, Any] | None] = []
+    futures: Dict[int, Future] = {}
+    for i, name in enumerate(names):
+        card = card_index.match(name)
+        if card is None:
+            cached, card = search_cache.lookup(name)
+            if not cached:
+                futures[i] = _search_executor.submit(search_card, client, name)
+        results.append(card)
+    if futures:
+        _, not_done = wait(futures.values(), timeout=deadline)
+        if not_done:
+            logger.warning(f"{len(not_done)} searches exceeded deadline of {deadline}s")
+        for i, future in futures.items():
+            if future in not_done:
+                future.cancel()
+                results[i] = card_index.fallback(names[i])
+            else:
+                results[i] = future.result()
+    return [card for card in results if card is not None]
+
+
+@get_cards_seconds.timed
+async def get_cards_async(
+    client: "AsyncClient", names: List[str], deadline: float = search_deadline
+) -> List[Dict[str, Any]]:
+    """get_cards for the asyncio runtime, multiplexed over one event loop."""
+    results: List[Dict[str, Any] | None] = []
+    tasks: Dict[int, asyncio.Task] = {}
+    for i, name in enumerate(names):
+        card = card_index.match(name)
+        if card is None:
+            cached, card = search_cache.lookup(name)
+            if not cached:
+                tasks[i] = asyncio.create_task(search_card_async(client, name))
+        results.append(card)
+    if tasks:
+        _, not_done = await asyncio.wait(tasks.values(), timeout=deadline)
+        if not_done:
+            logger.warning(f"{len(not_done)} searches exceeded deadline of {deadline}s")
+        for i, task in tasks.items():
+            if task in not_done:
+                task.cancel()
+                results[i] = card_index.fallback(names[i])
+            else:
+                results[i] = task.result()
+    return [card for card in results if card is not None]
+
+
+def summarize_cards(cards: List[Dict[str, Any]]) -> str:
+    """Konami IDs and English names only, for logs, rather than the whole API response."""
+    return ", ".join(f"{card['konami_id']}:{card['name']['en']}" for card in cards)
 
 
 def format_limit_regulation(value: int | None) -> int | None:
@@ -72,7 +198,9 @@ MASTER_DUEL_RARITY = {
 }
 
 
-def format_card_text(text: str | None) -> str:
+def format_card_text(text: str | None, limit: int | None = None) -> str:
+    if text and limit is not None and len(text) > limit:
+        text = text[:limit].rstrip() + "…"
     return text.replace("\n", "\n\n") if text else "\u200b"
 
 
@@ -101,7 +229,70 @@ def get_genesys_limit_regulation(card: Any) -> int:
     return genesys_limit_regulation.get(card["konami_id"]) or 0
 
 
-def generate_card_display(card: Any) -> str:
+# Keyed by card identity, text limit and limit regulation vector versions
+render_cache = TTLCache(maxsize=1024, ttl=60 * 60, negative_ttl=0)
+
+generate_card_display_seconds = Histogram(
+    "bastion_generate_card_display_seconds",
+    "Time to render one card, including render cache hits",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01),
+)
+
+
+def _cache_stats(results: Tuple[str, ...]):
+    for name, cache in (("search", search_cache), ("render", render_cache)):
+        stats = cache.stats()
+        for result in results:
+            yield (name, result), stats[result]
+
+
+Collected(
+    "bastion_cache_lookups_total",
+    "Cache lookups by result",
+    lambda: _cache_stats(("hits", "negative_hits", "misses")),
+    ("cache", "result"),
+    "counter",
+)
+# Evictions mean the cache is too small, expirations that the time to live is too short
+Collected(
+    "bastion_cache_removals_total",
+    "Cache entries removed by reason",
+    lambda: _cache_stats(("evictions", "expirations")),
+    ("cache", "reason"),
+    "counter",
+)
+Collected(
+    "bastion_cache_size",
+    "Entries in each cache",
+    lambda: [(("search",), len(search_cache)), (("render",), len(render_cache))],
+    ("cache",),
+)
+
+
+@generate_card_display_seconds.timed
+def generate_card_display(card: Any, text_limit: int | None = None) -> str:
+    """
+    Renders a card as Markdown. Memoized, so popular cards are only rendered once for each
+    version of the Master Duel and Genesys limit regulation.
+    """
+    # Card JSON is never modified, and a changed card such as after errata arrives as a new object
+    # from a new response, so cards are keyed by identity. Serializing a card to digest it costs
+    # more than rendering it. The card is kept in the entry so that its id cannot be reused
+    key = (
+        id(card),
+        text_limit,
+        master_duel_limit_regulation.version,
+        genesys_limit_regulation.version,
+    )
+    cached, entry = render_cache.lookup(key)
+    if cached and entry[0] is card:
+        return entry[1]
+    display = render_card_display(card, text_limit)
+    render_cache.put(key, (card, display))
+    return display
+
+
+def render_card_display(card: Any, text_limit: int | None = None) -> str:
     yugipedia_page = card["konami_id"] or quote_plus(card["name"]["en"])
     yugipedia = f"https://yugipedia.com/wiki/{yugipedia_page}?utm_source=bastion&utm_medium=reddit"
     ygoprodeck_term = card["password"] or quote_plus(card["name"]["en"])
@@ -179,20 +370,52 @@ def generate_card_display(card: Any) -> str:
         full_text += f"{description}\n\n"
 
         if card.get("pendulum_effect") is not None:
-            full_text += f"**Pendulum Effect**\n\n{format_card_text(card['pendulum_effect']['en'])}\n\n"
+            full_text += f"**Pendulum Effect**\n\n{format_card_text(card['pendulum_effect']['en'], text_limit)}\n\n"
 
-        full_text += f"**Card Text**\n\n{format_card_text(card['text']['en'])}"
+        full_text += (
+            f"**Card Text**\n\n{format_card_text(card['text']['en'], text_limit)}"
+        )
     else:
         # Spells and Traps
         description += "\n\n"
         description += f"{card['property']} {card['card_type']}"
-        full_text += (
-            f"{description}\n\n**Card Text**\n\n{format_card_text(card['text']['en'])}"
-        )
+        full_text += f"{description}\n\n**Card Text**\n\n{format_card_text(card['text']['en'], text_limit)}"
 
     full_text += f"\n\n{links}\n\n{format_footer(card)}"
     return full_text
 
 
-def display_cards(cards: List[Any]) -> str:
-    return "\n\n----\n\n".join(generate_card_display(card) for card in cards) + FOOTER
+def fit_card_display(card: Any, limit: int) -> str:
+    """
+    Renders a card in at most limit characters if possible, truncating its card text and
+    Pendulum Effect when the card cannot fit into a comment on its own.
+    """
+    display = generate_card_display(card)
+    text_limit = max(
+        len(card["text"]["en"] or ""),
+        len((card.get("pendulum_effect") or {}).get("en") or ""),
+    )
+    while len(display) > limit and text_limit > 0:
+        text_limit = max(0, text_limit - (len(display) - limit))
+        display = generate_card_display(card, text_limit)
+    return display
+
+
+def display_cards(cards: List[Any]) -> List[str]:
+    """
+    Packs the cards in order into as few comments as fit Reddit's length limit, each with the
+    footer, to be posted as a chain of replies.
+    """
+    limit = comment_limit - len(FOOTER)
+    pages: List[str] = []
+    page = ""
+    for card in cards:
+        block = fit_card_display(card, limit)
+        if page and len(page) + len(card_separator) + len(block) > limit:
+            pages.append(page + FOOTER)
+            page = block
+        else:
+            page = f"{page}{card_separator}{block}" if page else block
+    if page:
+        pages.append(page + FOOTER)
+    return pages
@@ -0,0 +1,175 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import logging
+from math import ceil
+from random import uniform
+import re
+from sys import intern
+from threading import Event, Thread
+from typing import Any, Dict, FrozenSet, List, Set, TYPE_CHECKING
+import unicodedata
+
+from metrics import Counter as MetricCounter
+
+if TYPE_CHECKING:
+    import httpx
+
+
+punctuation_regex = re.compile(r"[^\w\s]")
+
+
+def normalize(name: str) -> str:
+    """Case-folded, without diacritics or punctuation and with single spaces."""
+    name = unicodedata.normalize("NFKD", name.casefold())
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(punctuation_regex.sub(" ", name).split())
+
+
+def trigrams(name: str) -> Set[str]:
+    padded = f"  {name} "
+    # Interned, so the index holds one copy of each trigram
+    return {intern(padded[i : i + 3]) for i in range(len(padded) - 2)}
+
+
+class CardIndex:
+    """
+    Immutable in-memory index over a bulk card dump, in the same format as search responses.
+    Cards are matched exactly by normalized name in any locale, password or listed alias,
+    then fuzzily by the Dice coefficient of the trigrams of their English names.
+    """
+
+    def __init__(self, cards: List[Dict[str, Any]]) -> None:
+        self._cards = cards
+        self._exact: Dict[str, int] = {}
+        self._trigrams: List[FrozenSet[str]] = []
+        self._postings: Dict[str, List[int]] = {}
+        for i, card in enumerate(cards):
+            keys = [*card["name"].values(), *card.get("aliases", [])]
+            if card.get("password"):
+                keys.append(str(card["password"]))
+            for key in keys:
+                if key:
+                    self._exact.setdefault(normalize(key), i)
+            grams = trigrams(normalize(card["name"]["en"]))
+            self._trigrams.append(frozenset(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def exact(self, name: str) -> Dict[str, Any] | None:
+        i = self._exact.get(normalize(name))
+        return None if i is None else self._cards[i]
+
+    def fuzzy(
+        self, name: str, threshold: float, margin: float
+    ) -> Dict[str, Any] | None:
+        """The closest card, if it scores at least threshold and beats the next by margin."""
+        grams = trigrams(normalize(name))
+        # Any card scoring at least the lowest relevant score must share this many trigrams,
+        # so it must have at least one of the rarest len(grams) - shared + 1 trigrams
+        lowest = threshold - margin
+        shared = ceil(lowest * len(grams) / (2 - lowest))
+        rarest = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+        candidates: Set[int] = set()
+        for gram in rarest[: len(grams) - shared + 1]:
+            candidates.update(self._postings.get(gram, ()))
+        scores = []
+        for i in candidates:
+            other = self._trigrams[i]
+            scores.append((2 * len(grams & other) / (len(grams) + len(other)), i))
+        scores = sorted(scores)[-2:]
+        if not scores or scores[-1][0] < threshold:
+            return None
+        if len(scores) == 2 and scores[-1][0] - scores[0][0] < margin:
+            return None
+        return self._cards[scores[-1][1]]
+
+
+card_index_lookups = MetricCounter(
+    "bastion_card_index_lookups_total",
+    "Card index lookups by result",
+    ("result",),
+)
+
+
+class UpdatingCardIndex(Thread):
+    """
+    Optional local card index, fetched from a bulk dump with conditional requests and rebuilt in
+    the background on an interval. Until the first dump is loaded, nothing matches.
+    """
+
+    # Confident enough to skip the remote search
+    THRESHOLD = 0.85
+    MARGIN = 0.1
+    # Better than nothing when the remote search fails
+    FALLBACK_THRESHOLD = 0.5
+
+    def __init__(self, interval: float = 6 * 60 * 60, jitter: float = 5 * 60) -> None:
+        super().__init__(name="card-index", daemon=True)
+        self._logger = logging.getLogger(self.name)
+        self._index = CardIndex([])
+        self._url: str | None = None
+        self._client: "httpx.Client" = None
+        self._etag: str | None = None
+        self._interval = interval
+        self._jitter = jitter
+        self._stopped = Event()
+
+    # Post-initialization, remove when globals are removed
+    def configure(self, url: str, api_client: "httpx.Client") -> None:
+        self._url = url
+        self._client = api_client
+
+    def update(self) -> None:
+        self._logger.info(f"Updating from [{self._url}]")
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+        try:
+            response = self._client.get(self._url, headers=headers, timeout=60)
+            if response.status_code == 304:
+                self._logger.info(f"Not modified [{self._url}]")
+                return
+            response.raise_for_status()
+            index = CardIndex(response.json())
+            # Replacing the reference is atomic, so readers never need a lock
+            self._index = index
+            self._etag = response.headers.get("ETag")
+            self._logger.info(f"Indexed {len(index)} cards")
+        except Exception:
+            self._logger.error(f"Failed GET [{self._url}]", exc_info=1)
+
+    def match(self, name: str) -> Dict[str, Any] | None:
+        """A card only if name matches confidently, otherwise the remote search should decide."""
+        index = self._index
+        # Not configured or not loaded yet, which is not a miss
+        if not len(index):
+            return None
+        card = index.exact(name)
+        if card is not None:
+            card_index_lookups.inc("exact")
+            return card
+        card = index.fuzzy(name, self.THRESHOLD, self.MARGIN)
+        card_index_lookups.inc("miss" if card is None else "fuzzy")
+        return card
+
+    def fallback(self, name: str) -> Dict[str, Any] | None:
+        """The best reasonable match, for when the remote search has failed."""
+        card = self._index.fuzzy(name, self.FALLBACK_THRESHOLD, 0)
+        if card is not None:
+            card_index_lookups.inc("fallback")
+        return card
+
+    def run(self) -> None:
+        self.update()
+        while not self._stopped.wait(
+            self._interval + uniform(-self._jitter, self._jitter)
+        ):
+            self.update()
+
+    def cancel(self) -> None:
+        self._stopped.set()
+
+
+# Global, to eventually remove
+card_index = UpdatingCardIndex()
@@ -2,30 +2,80 @@
 # SPDX-Licence-Identifier: AGPL-3.0-or-later
 from os import getenv
 from platform import python_version
-from typing import Literal
+from threading import Lock
+from typing import Any, Literal, TYPE_CHECKING
 
 import httpx
-import praw
 
+if TYPE_CHECKING:
+    import asyncpraw
+    import praw
 
-def user_agent(client: Literal["praw", "httpx"]) -> str:
+
+def user_agent(client: Literal["praw", "asyncpraw", "httpx"]) -> str:
     revision = getenv("REVISION")
     if client == "praw":
+        import praw
+
         client_version = praw.__version__
+    elif client == "asyncpraw":
+        import asyncpraw
+
+        client_version = asyncpraw.__version__
     else:
         client_version = httpx.__version__
     return f"Bastion/{revision} (by /u/BastionBotDev; +https://github.com/DawnbrandBots/bastion-for-reddit) {client}/{client_version} py/{python_version()}"
 
 
-def get_reddit_client() -> praw.Reddit:
-    return praw.Reddit(
+def _serialize_requests(reddit: "praw.Reddit") -> None:
+    """
+    PRAW and prawcore are not thread-safe: each session's rate limiter and token refresh are
+    updated without locking. One lock around every session request makes the client safe to
+    share between threads. Requests are spaced out by the rate budget anyway, so they rarely wait.
+    """
+    lock = Lock()
+    # Read-only and authorized sessions, which share the requestor
+    for session in {reddit._read_only_core, reddit._authorized_core} - {None}:
+        request = session.request
+
+        def locked(*args: Any, request=request, **kwargs: Any) -> Any:
+            with lock:
+                return request(*args, **kwargs)
+
+        session.request = locked
+
+
+# PRAW is slow to import, so it is loaded after the startup fetches are under way
+def get_reddit_client() -> "praw.Reddit":
+    import praw
+
+    reddit = praw.Reddit(
         client_id=getenv("REDDIT_CLIENT_ID"),
         client_secret=getenv("REDDIT_CLIENT_SECRET"),
         username=getenv("REDDIT_USERNAME"),
         password=getenv("REDDIT_PASSWORD"),
         user_agent=user_agent("praw"),
     )
+    _serialize_requests(reddit)
+    return reddit
 
 
 def get_api_client() -> httpx.Client:
     return httpx.Client(http2=True, headers={"User-Agent": user_agent("httpx")})
+
+
+# Only needed by the asyncio runtime, so imported on demand
+def get_async_reddit_client() -> "asyncpraw.Reddit":
+    import asyncpraw
+
+    return asyncpraw.Reddit(
+        client_id=getenv("REDDIT_CLIENT_ID"),
+        client_secret=getenv("REDDIT_CLIENT_SECRET"),
+        username=getenv("REDDIT_USERNAME"),
+        password=getenv("REDDIT_PASSWORD"),
+        user_agent=user_agent("asyncpraw"),
+    )
+
+
+def get_async_api_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(http2=True, headers={"User-Agent": user_agent("httpx")})
@@ -0,0 +1,115 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+# Filtering decisions shared by the threaded and asyncio runtimes. They read only the store and
+# what listings already loaded, so each runtime makes its own Reddit calls around them
+import logging
+from typing import List, Tuple, Union, TYPE_CHECKING
+
+from antiabuse import is_author
+from card import parse_summons
+from logs import SAMPLED, timestamp_to_iso
+from metrics import summons_parsed
+from reply_history import history_covers
+from shard import all_subreddits
+
+if TYPE_CHECKING:
+    from praw.models import Comment, Submission
+
+    from store import Store
+
+
+# https://github.com/DawnbrandBots/bastion-for-reddit/issues/13
+MAX_REPLIES_PER_SUBMISSION = 10
+# Bulk request limit, https://www.reddit.com/dev/api#POST_api_read_message
+MARK_READ_BATCH = 25
+
+
+def exceeded_reply_limit(store: "Store", submission_id: str) -> bool:
+    # Shared by all threads and persisted, so the limit holds across restarts.
+    # Queued replies count so that a burst cannot overshoot before they are sent
+    replies = store.reply_count(submission_id)
+    replies += store.pending_reply_count(submission_id)
+    return replies >= MAX_REPLIES_PER_SUBMISSION
+
+
+def replied_locally(
+    store: "Store", post: Union["Comment", "Submission"]
+) -> bool | None:
+    """
+    Whether post was replied to, answered by the store once it holds the account's reply history
+    back to when post was created. None if only loading comments from Reddit can tell.
+    """
+    if store.has_replied(post.fullname):
+        return True
+    if history_covers(store, post.created_utc):
+        return False
+    return None
+
+
+def submission_summons(submission: "Submission", logger: logging.Logger) -> List[str]:
+    summons = parse_summons(submission.selftext)
+    logger.info(
+        "%s| summons: %s", submission.id, summons, extra=None if summons else SAMPLED
+    )
+    return summons
+
+
+def comment_summons(
+    store: "Store", comment: "Comment", me: str, logger: logging.Logger
+) -> List[str]:
+    if is_author(comment, me):
+        logger.info("%s: skip, self", comment.id, extra=SAMPLED)
+        return []
+    if exceeded_reply_limit(store, comment.submission.id):
+        logger.warning(
+            f"{comment.id}: skip, exceeded limit for {comment.submission.id}"
+        )
+        return []
+    summons = parse_summons(comment.body)
+    logger.info(
+        "%s| summons: %s", comment.id, summons, extra=None if summons else SAMPLED
+    )
+    return summons
+
+
+def unread_mentions(batch: List["Comment"], logger: logging.Logger) -> List["Comment"]:
+    unread = []
+    for comment in batch:
+        if comment.new:
+            unread.append(comment)
+        else:
+            logger.info(f"{comment.id}|{comment.context}| skip, read")
+    return unread
+
+
+def claim_mentions(
+    store: "Store", unread: List["Comment"], logger: logging.Logger
+) -> List[Tuple["Comment", List[str]]]:
+    """
+    Parses read mentions and claims those to answer, with their summons. Every shard reads the
+    same inbox, so the claim decides which one handles each mention. Summon chains are left to
+    the caller, which can check a whole batch at once.
+    """
+    subreddits = all_subreddits()
+    claimed = []
+    for comment in unread:
+        summons = parse_summons(comment.body)
+        if summons and comment.subreddit.display_name.lower() in subreddits:
+            # Left unclaimed for the comment stream of that subreddit
+            logger.info(f"{comment.id}: skip, in a streamed subreddit")
+            continue
+        if not store.claim(comment.fullname):
+            logger.info(f"{comment.id}|{comment.context}| skip, processed")
+            continue
+        logger.info(
+            f"{comment.id}|{comment.context}|{timestamp_to_iso(comment.created_utc)}"
+        )
+        if exceeded_reply_limit(store, comment.submission.id):
+            logger.warning(
+                f"{comment.id}: skip, exceeded limit for {comment.submission.id}"
+            )
+            continue
+        summons_parsed.inc("mentions", amount=len(summons))
+        logger.info(f"{comment.id}| summons: {summons}")
+        claimed.append((comment, summons))
+    return claimed
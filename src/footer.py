@@ -7,3 +7,10 @@ FOOTER = """
 ^by [^(u&#47;BastionBotDev)](/user/BastionBotDev) ^|
 [^(GitHub)](https://github.com/DawnbrandBots/bastion-for-reddit) ^|
 ^Licence: [^(GNU&nbsp;AGPL&nbsp;3.0+)](https://choosealicense.com/licenses/agpl-3.0/)"""
+
+INFO = f"""Free and open source _Yu-Gi-Oh!_ bot. Use {{{{card name}}}} in your posts and comments to have me reply with card information.
+Also works outside of Yu-Gi-Oh! subreddits if you mention me in the comment.
+{FOOTER}
+"""
+
+TOO_LONG = f"Sorry, the cards are too long to fit into one comment.{FOOTER}"
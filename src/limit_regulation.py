@@ -1,57 +1,248 @@
-# SPDX-FileCopyrightText: © 2023–2025 Kevin Lu
+# SPDX-FileCopyrightText: © 2023–2026 Kevin Lu
 # SPDX-Licence-Identifier: AGPL-3.0-or-later
-from datetime import datetime
+from array import array
+from bisect import bisect_left
 import logging
-from threading import Timer
-from typing import Dict, TYPE_CHECKING
+import mmap
+import os
+from random import uniform
+import struct
+from threading import Event, Thread
+from time import time
+from typing import List, Tuple, TYPE_CHECKING
+
+from metrics import Collected
+from startup import milestone
 
 if TYPE_CHECKING:
     import httpx
 
 
+# Snapshot layout, in native byte order: magic, entry count, ETag and Last-Modified lengths,
+# then the validators, padding to a multiple of four, sorted Konami IDs and their limits
+# The magic changes with the layout, so snapshots from older versions are refetched instead
+SNAPSHOT_MAGIC = b"BLR2"
+SNAPSHOT_HEADER = struct.Struct("=4sIII")
+
+# Sorted Konami IDs and the limit for each, either arrays or memoryviews over a snapshot
+Vector = Tuple[array | memoryview, array | memoryview]
+
+
 # https://github.com/DawnbrandBots/bastion-bot/blob/master/src/limit-regulation.ts
 class UpdatingLimitRegulationVector:
-    def __init__(self, url: str, api_client: "httpx.Client" = None) -> None:
-        self._vector: Dict[int, int] = {}
+    """
+    Limit regulation vector held as parallel arrays of sorted Konami IDs and limits, looked up by
+    binary search. The last good vector is saved to a binary snapshot, which is memory-mapped on
+    startup instead of waiting on the network.
+    """
+
+    def __init__(self, name: str, url: str, api_client: "httpx.Client" = None) -> None:
+        self.name = name
+        self._vector: Vector = (array("I"), array("h"))
         self._logger = logging.getLogger(__name__)
         self._url = url
         self._client = api_client
-        self._timer = Timer(60000, self.update)
+        self._snapshot: str | None = None
+        # Validators from the last successful response for conditional requests
+        self._etag: str | None = None
+        self._last_modified: str | None = None
+        # Incremented whenever the vector changes, for caches derived from it
+        self.version = 0
+        # Wall clock time the vector was last confirmed current, including from a snapshot
+        self.updated: float | None = None
 
     # Post-initialization, remove when globals are removed
     def set_client(self, api_client: "httpx.Client") -> None:
         self._client = api_client
 
-    def update(self, initial: bool = False) -> None:
-        if initial or datetime.now().minute == 0:
-            self._logger.info(f"Updating from [{self._url}]")
-            try:
-                response = self._client.get(self._url)
-                regulation = response.json()["regulation"]
-                self._vector = {
-                    int(konami_id): limit for konami_id, limit in regulation.items()
-                }
-                self._logger.info(f"Read {len(self._vector)} entries")
-            except Exception:
-                self._logger.error(f"Failed GET [{self._url}]", exc_info=1)
+    def set_snapshot(self, path: str) -> None:
+        self._snapshot = path
+
+    def update(self) -> None:
+        self._logger.info(f"Updating from [{self._url}]")
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        try:
+            response = self._client.get(self._url, headers=headers)
+            if response.status_code == 304:
+                self._logger.info(f"Not modified [{self._url}]")
+                self.updated = time()
+                return
+            response.raise_for_status()
+            regulation = response.json()["regulation"]
+            entries = sorted(
+                (int(konami_id), limit) for konami_id, limit in regulation.items()
+            )
+            vector = (
+                array("I", (konami_id for konami_id, _ in entries)),
+                # Genesys points do not fit in a byte; out of range values fail the update
+                array("h", (limit for _, limit in entries)),
+            )
+            self._logger.info(f"Read {len(entries)} entries")
+            self._etag = response.headers.get("ETag")
+            self._last_modified = response.headers.get("Last-Modified")
+            self.updated = time()
+            changed = vector != self._vector
+            if changed:
+                self._replace(vector)
+            if changed or self._snapshot and not os.path.exists(self._snapshot):
+                self._save(vector)
+        except Exception:
+            self._logger.error(f"Failed GET [{self._url}]", exc_info=1)
+
+    def _replace(self, vector: Vector) -> None:
+        # Replacing the reference is atomic, so readers never need a lock
+        self._vector = vector
+        self.version += 1
+
+    def _save(self, vector: Vector) -> None:
+        if not self._snapshot:
+            return
+        etag = (self._etag or "").encode()
+        last_modified = (self._last_modified or "").encode()
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, len(vector[0]), len(etag), len(last_modified)
+        )
+        validators = etag + last_modified
+        padding = -(len(header) + len(validators)) % vector[0].itemsize
+        temporary = f"{self._snapshot}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                f.write(header + validators + bytes(padding))
+                f.write(vector[0])
+                f.write(vector[1])
+            # Atomic, and existing mappings of the old file stay valid
+            os.replace(temporary, self._snapshot)
+            self._logger.info(f"Saved snapshot [{self._snapshot}]")
+        except OSError:
+            self._logger.error(
+                f"Failed to save snapshot [{self._snapshot}]", exc_info=1
+            )
+
+    def load(self) -> bool:
+        """Memory-maps the snapshot if there is one. Returns whether it was loaded."""
+        if not self._snapshot or not os.path.exists(self._snapshot):
+            return False
+        try:
+            with open(self._snapshot, "rb") as f:
+                view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            magic, count, etag_length, last_modified_length = (
+                SNAPSHOT_HEADER.unpack_from(view)
+            )
+            offset = SNAPSHOT_HEADER.size + etag_length + last_modified_length
+            offset += -offset % 4
+            if magic != SNAPSHOT_MAGIC or len(view) != offset + count * 6:
+                raise ValueError("corrupt snapshot")
+            validators = bytes(view[SNAPSHOT_HEADER.size : offset])
+            self._etag = validators[:etag_length].decode() or None
+            self._last_modified = (
+                validators[etag_length : etag_length + last_modified_length].decode()
+                or None
+            )
+            keys = view[offset : offset + count * 4].cast("I")
+            limits = view[offset + count * 4 :].cast("h")
+            self._replace((keys, limits))
+            self.updated = os.path.getmtime(self._snapshot)
+            self._logger.info(f"Loaded {count} entries from [{self._snapshot}]")
+            return True
+        except (OSError, ValueError, struct.error):
+            self._logger.error(
+                f"Failed to load snapshot [{self._snapshot}]", exc_info=1
+            )
+            return False
 
     def get(self, konami_id: int) -> int | None:
-        return self._vector.get(konami_id)
+        keys, limits = self._vector
+        index = bisect_left(keys, konami_id)
+        if index < len(keys) and keys[index] == konami_id:
+            return limits[index]
+        return None
+
+
+class LimitRegulationScheduler(Thread):
+    """
+    Refreshes all vectors in the background as soon as it starts, then on an interval, randomly
+    offset by up to jitter seconds so that restarts do not line up requests.
+    """
 
-    def start(self) -> None:
-        self._timer.start()
+    def __init__(
+        self,
+        vectors: List[UpdatingLimitRegulationVector],
+        interval: float = 60 * 60,
+        jitter: float = 5 * 60,
+    ) -> None:
+        super().__init__(name="limit-regulation", daemon=True)
+        self._logger = logging.getLogger(self.name)
+        self._vectors = vectors
+        self._interval = interval
+        self._jitter = jitter
+        self._stopped = Event()
+        self._updated = Event()
+
+    def set_client(self, api_client: "httpx.Client") -> None:
+        for vector in self._vectors:
+            vector.set_client(api_client)
+
+    def set_snapshot_directory(self, directory: str) -> None:
+        for vector in self._vectors:
+            vector.set_snapshot(os.path.join(directory, f"{vector.name}.vector"))
+
+    def load(self) -> bool:
+        """Loads every vector from its snapshot. Returns whether all were loaded."""
+        # Every vector is loaded, even after one fails
+        loaded = [vector.load() for vector in self._vectors]
+        return all(loaded)
+
+    def update(self) -> None:
+        """Updates all vectors concurrently, so one slow endpoint does not hold up the rest."""
+        threads = [
+            Thread(target=vector.update, name=f"{self.name}-{vector.name}")
+            for vector in self._vectors
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._updated.set()
+        milestone("limit_regulation_updated")
+
+    def wait_updated(self, timeout: float | None = None) -> bool:
+        """Blocks until the first update after starting completes or timeout seconds pass."""
+        return self._updated.wait(timeout)
+
+    def run(self) -> None:
+        self.update()
+        while not self._stopped.wait(
+            self._interval + uniform(-self._jitter, self._jitter)
+        ):
+            self.update()
 
     def cancel(self) -> None:
-        self._timer.cancel()
+        self._stopped.set()
 
 
 # Globals, to eventually remove
 master_duel_limit_regulation = UpdatingLimitRegulationVector(
-    "https://dawnbrandbots.github.io/yaml-yugi-limit-regulation/master-duel/current.vector.json"
-)
-rush_duel_limit_regulation = UpdatingLimitRegulationVector(
-    "https://dawnbrandbots.github.io/yaml-yugi-limit-regulation/rush/current.vector.json"
+    "master-duel",
+    "https://dawnbrandbots.github.io/yaml-yugi-limit-regulation/master-duel/current.vector.json",
 )
 genesys_limit_regulation = UpdatingLimitRegulationVector(
-    "https://dawnbrandbots.github.io/yaml-yugi-limit-regulation/genesys/current.vector.json"
+    "genesys",
+    "https://dawnbrandbots.github.io/yaml-yugi-limit-regulation/genesys/current.vector.json",
+)
+limit_regulation_scheduler = LimitRegulationScheduler(
+    [master_duel_limit_regulation, genesys_limit_regulation]
+)
+Collected(
+    "bastion_limit_regulation_age_seconds",
+    "Seconds since each limit regulation vector was last confirmed current",
+    lambda: [
+        ((vector.name,), time() - vector.updated)
+        for vector in (master_duel_limit_regulation, genesys_limit_regulation)
+        if vector.updated is not None
+    ],
+    ("vector",),
 )
@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import atexit
+from copy import copy
+from datetime import datetime, timezone
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from os import getenv
+from queue import SimpleQueue
+from random import random
+from typing import Any, Callable
+
+# Pass as extra= on noisy per-item lines so that they are subject to LOG_SAMPLE_RATE
+SAMPLED = {"sampled": True}
+
+
+def timestamp_to_iso(created_utc: float) -> str:
+    return datetime.fromtimestamp(created_utc, timezone.utc).isoformat()
+
+
+class Lazy:
+    """
+    Log argument computed only when the message is interpolated, so that records dropped by
+    sampling cost no more than the call.
+    """
+
+    def __init__(self, function: Callable[[], Any]) -> None:
+        self._function = function
+
+    def __str__(self) -> str:
+        return str(self._function())
+
+
+class SampleFilter(logging.Filter):
+    """Keeps only a fraction of records marked with SAMPLED, before they are formatted."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self._rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(record, "sampled", False) or random() < self._rate
+
+
+class BufferedHandler(QueueHandler):
+    """
+    Like QueueHandler, but only interpolates the message on the logging thread, leaving tracebacks
+    and everything else to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log aggregation."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging() -> QueueListener:
+    """
+    Logs through a queue, so that threads on the hot path only enqueue records and formatting and
+    writing happen on the listener's thread. LOG_FORMAT=json switches to structured output.
+    """
+    handler = logging.StreamHandler()
+    if getenv("LOG_FORMAT") == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    queue = SimpleQueue()
+    queue_handler = BufferedHandler(queue)
+    queue_handler.addFilter(SampleFilter(float(getenv("LOG_SAMPLE_RATE", "1"))))
+    root = logging.getLogger()
+    root.setLevel(getenv("LOG_LEVEL", "INFO"))
+    root.addHandler(queue_handler)
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+    listener.start()
+    # Flush what is still queued on exit
+    atexit.register(listener.stop)
+    return listener
@@ -1,63 +1,96 @@
 # SPDX-FileCopyrightText: © 2023–2024 Kevin Lu, Luna Brand
 # SPDX-Licence-Identifier: AGPL-3.0-or-later
-from os import getenv
-from typing import TYPE_CHECKING
+from functools import partial
+from math import ceil
+from time import sleep
+from typing import List, TYPE_CHECKING
 
-from praw.models.util import stream_generator
+from praw.models.util import ExponentialCounter, stream_generator
 
-from antiabuse import is_summon_chain
-from bot_thread import BotThread, timestamp_to_iso
-from card import parse_summons, get_cards, display_cards
-from footer import FOOTER
+from bot_thread import BotThread
+from card import get_cards, display_cards, summarize_cards
+from filters import MARK_READ_BATCH, claim_mentions, unread_mentions
+from footer import INFO
+from metrics import items_seen
+from pipeline import stage_latency
+from ratelimit import Priority
 
 if TYPE_CHECKING:
     import httpx
+    import praw
+    from praw.models import Comment
 
-
-INFO = f"""Free and open source _Yu-Gi-Oh!_ bot. Use {{{{card name}}}} in your posts and comments to have me reply with card information.
-Also works outside of Yu-Gi-Oh! subreddits if you mention me in the comment.
-{FOOTER}
-"""
+    from pipeline import WorkQueue
+    from ratelimit import RateBudget
+    from reply_queue import ReplySender
+    from store import Store
 
 
 class MentionsThread(BotThread):
-    def __init__(self, api_client: "httpx.Client") -> None:
-        super().__init__(api_client, name="mentions")
+    def __init__(
+        self,
+        api_client: "httpx.Client",
+        reddit: "praw.Reddit",
+        budget: "RateBudget",
+        store: "Store",
+        work_queue: "WorkQueue",
+        replies: "ReplySender",
+    ) -> None:
+        super().__init__(
+            api_client, reddit, budget, store, work_queue, replies, name="mentions"
+        )
 
     # @override
     def _run(self) -> None:
-        subreddits = getenv("SUBREDDITS").split("+")
         # Note: if a mention qualifies as a comment or post reply, it will not show up in this listing
-        for comment in stream_generator(self._reddit.inbox.mentions):
-            if not comment.new:
-                self._logger.info(f"{comment.id}|{comment.context}| skip, read")
-                continue
-            self._logger.info(
-                f"{comment.id}|{comment.context}|{timestamp_to_iso(comment.created_utc)}"
-            )
-            comment.mark_read()
-            if (
-                self._reply_counter[comment.submission.id]
-                >= self.MAX_REPLIES_PER_SUBMISSION
-            ):
-                self._logger.warning(
-                    f"{comment.id}: skip, exceeded limit for {comment.submission.id}"
-                )
-                continue
-            if is_summon_chain(comment):
+        # Mentions are handled in batches, flushed whenever a poll has nothing new or the batch is
+        # full. pause_after=0 hands control back on those polls instead of sleeping, so back off here
+        counter = ExponentialCounter(max_counter=16)
+        batch: List["Comment"] = []
+        mentions = self._polled(self._reddit.inbox.mentions)
+        for comment in stream_generator(mentions, pause_after=0):
+            if comment is not None:
+                items_seen.inc(self.name)
+                batch.append(comment)
+                if len(batch) < MARK_READ_BATCH:
+                    continue
+            if batch:
+                self._process_batch(batch)
+                batch = []
+                counter.reset()
+            else:
+                sleep(counter.counter())
+
+    def _process_batch(self, batch: List["Comment"]) -> None:
+        """
+        Marks the whole batch read in one request, filters it with fields already in the listing,
+        then checks the ancestors of the rest for summon chains with one request per level.
+        """
+        unread = unread_mentions(batch, self._logger)
+        if not unread:
+            return
+        self._budget.acquire(Priority.DEDUP, ceil(len(unread) / MARK_READ_BATCH))
+        self._reddit.inbox.mark_read(unread)
+        with stage_latency.time("parse"):
+            candidates = claim_mentions(self._store, unread, self._logger)
+        with stage_latency.time("dedup"):
+            chains = self._summon_chains(comment.parent_id for comment, _ in candidates)
+        for comment, summons in candidates:
+            if comment.parent_id in chains:
                 self._logger.info(f"{comment.id}: skip, parent comment is me")
                 continue
-            summons = parse_summons(comment.body)
-            self._logger.info(f"{comment.id}| summons: {summons}")
-            if not len(summons):
+            self._enqueue(comment, partial(self._process, summons=summons))
+
+    # Runs on a worker thread
+    def _process(self, comment: "Comment", summons: List[str]) -> None:
+        if not len(summons):
+            with stage_latency.time("reply"):
                 self._reply(comment, INFO)
-                continue
-            if comment.subreddit.display_name.lower() not in subreddits:
-                cards = get_cards(self._client, summons)
-                self._logger.info(f"{comment.id}| cards: {cards}")
-                if not len(cards):
-                    self._reply(comment, INFO)
-                else:
-                    reply = display_cards(cards)
-                    self._reply(comment, reply)
-            # Other case should be handled by CommentsThread
+            return
+        with stage_latency.time("lookup"):
+            cards = get_cards(self._client, summons)
+        self._logger.info(f"{comment.id}| cards: {summarize_cards(cards)}")
+        with stage_latency.time("render"):
+            pages = display_cards(cards) if len(cards) else [INFO]
+        with stage_latency.time("reply"):
+            self._reply(comment, *pages)
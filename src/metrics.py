@@ -0,0 +1,227 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+# Minimal metrics in the Prometheus text exposition format, served with the standard library
+# https://prometheus.io/docs/instrumenting/exposition_formats/
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from inspect import iscoroutinefunction
+import logging
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from profiling import profiler
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Labels, Labels, float]
+
+_logger = logging.getLogger(__name__)
+_registry: List["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+class Metric:
+    def __init__(self, name: str, help: str, type: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labels = labels
+        _registry.append(self)
+
+    def samples(self) -> Iterable[Sample]:
+        """Yields the name suffix, label names, label values and value of each sample."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, names, values, value in self.samples():
+            labels = ",".join(
+                f'{name}="{_escape(str(label))}"' for name, label in zip(names, values)
+            )
+            lines.append(
+                f"{self.name}{suffix}{{{labels}}} {value}"
+                if labels
+                else f"{self.name}{suffix} {value}"
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    def __init__(self, name: str, help: str, labels: Labels = ()) -> None:
+        super().__init__(name, help, "counter", labels)
+        self._lock = Lock()
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield "", self.labels, labels, value
+
+
+# Seconds, from a cached render to a slow search
+DEFAULT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram(Metric):
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Labels = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, "histogram", labels)
+        self._buckets = buckets
+        self._lock = Lock()
+        # Per bucket counts, not yet cumulative, followed by the sum
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self._buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(monotonic() - start, *labels)
+
+    def timed(self, function: Callable) -> Callable:
+        """Decorates a function or coroutine function to observe how long each call takes."""
+        if iscoroutinefunction(function):
+
+            @wraps(function)
+            async def timed_coroutine(*args, **kwargs):
+                with self.time():
+                    return await function(*args, **kwargs)
+
+            return timed_coroutine
+
+        @wraps(function)
+        def timed_function(*args, **kwargs):
+            with self.time():
+                return function(*args, **kwargs)
+
+        return timed_function
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = [(labels, list(counts)) for labels, counts in self._values.items()]
+        names = self.labels + ("le",)
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self._buckets + ("+Inf",), counts):
+                cumulative += count
+                yield "_bucket", names, labels + (str(bound),), cumulative
+            yield "_sum", self.labels, labels, counts[-1]
+            yield "_count", self.labels, labels, cumulative
+
+
+class Collected(Metric):
+    """Gauge or counter read from elsewhere when scraped, from (label values, value) pairs."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        collect: Callable[[], Iterable[Tuple[Labels, float]]],
+        labels: Labels = (),
+        type: str = "gauge",
+    ) -> None:
+        super().__init__(name, help, type, labels)
+        self._collect = collect
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self._collect():
+            yield "", self.labels, labels, value
+
+
+def render() -> str:
+    sections = []
+    # Lists can be appended to while iterated, so metrics registered meanwhile are fine
+    for metric in _registry:
+        try:
+            sections.append(metric.render())
+        except Exception as e:
+            # One broken collector should not hide every other metric
+            _logger.error(f"Failed to collect {metric.name}", exc_info=e)
+    return "\n".join(sections) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self._send(render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif url.path == "/profile":
+            # Blocks this request for the duration, in collapsed stack format
+            try:
+                seconds = float(parse_qs(url.query).get("seconds", ["30"])[0])
+            except ValueError:
+                self.send_error(400, "seconds must be a number")
+                return
+            try:
+                self._send(profiler.profile(seconds), "text/plain; charset=utf-8")
+            except RuntimeError as e:
+                self.send_error(409, str(e))
+        else:
+            self.send_error(404)
+
+    def _send(self, text: str, content_type: str) -> None:
+        body = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        _logger.debug(format % args)
+
+
+def start_server(host: str, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    _logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+# Shared by both runtimes
+items_seen = Counter(
+    "bastion_items_seen_total", "Items read from each stream", ("stream",)
+)
+summons_parsed = Counter(
+    "bastion_summons_parsed_total", "Card summons parsed in each stream", ("stream",)
+)
+prefilter_rejected = Counter(
+    "bastion_prefilter_rejected_total",
+    "Items in each stream rejected for having no summon, before anything else is read",
+    ("stream",),
+)
+reply_seconds = Histogram(
+    "bastion_reply_seconds", "Latency of posting a reply to Reddit"
+)
+thread_exceptions = Counter(
+    "bastion_thread_exceptions_total",
+    "Exceptions caught at the top of each thread or task loop",
+    ("thread",),
+)
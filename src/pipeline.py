@@ -0,0 +1,165 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import logging
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, Iterator, Literal, get_args
+
+from metrics import thread_exceptions
+from profiling import tracer
+
+
+@dataclass
+class WorkItem:
+    stream: str
+    post: Any
+    process: Callable[[Any], None]
+    enqueued: float = field(default_factory=monotonic)
+
+
+class StageLatency:
+    """
+    Thread-safe running count, total and maximum of the seconds spent in each stage.
+    Timed stages are also traced as spans when inside a sampled item.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._stages: Dict[str, list] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._stages.setdefault(stage, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = monotonic()
+        try:
+            yield
+        finally:
+            end = monotonic()
+            self.record(stage, end - start)
+            tracer.complete(stage, start, end)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {"count": count, "mean": total / count, "max": maximum}
+                for stage, (count, total, maximum) in self._stages.items()
+            }
+
+
+# Shared by all stream threads and workers
+stage_latency = StageLatency()
+
+DropPolicy = Literal["block", "drop-newest", "drop-oldest"]
+
+
+class WorkQueue:
+    """
+    Bounded queue between stream readers and workers. When full, readers either block, which
+    applies backpressure to the stream, or drop the newest or oldest item.
+    """
+
+    def __init__(self, maxsize: int, policy: DropPolicy = "block") -> None:
+        self._logger = logging.getLogger(__name__)
+        if policy not in get_args(DropPolicy):
+            raise ValueError(
+                f"QUEUE_POLICY {policy} is not one of {', '.join(get_args(DropPolicy))}"
+            )
+        self._queue: Queue[WorkItem] = Queue(maxsize)
+        self._policy = policy
+        self.dropped = 0
+
+    def put(self, item: WorkItem) -> None:
+        if self._policy == "block":
+            self._queue.put(item)
+            return
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except Full:
+                if self._policy == "drop-newest":
+                    self._drop(item)
+                    return
+            try:
+                self._drop(self._queue.get_nowait())
+                self._queue.task_done()
+            except Empty:
+                pass
+
+    def _drop(self, item: WorkItem) -> None:
+        self.dropped += 1
+        self._logger.warning(f"{item.post.id}: dropped from {item.stream}, queue full")
+
+    def get(self, timeout: float | None = None) -> WorkItem:
+        return self._queue.get(timeout=timeout)
+
+    def task_done(self) -> None:
+        self._queue.task_done()
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+
+class Worker(Thread):
+    def __init__(self, queue: WorkQueue, index: int) -> None:
+        super().__init__(name=f"worker-{index}", daemon=True)
+        self._logger = logging.getLogger(self.name)
+        self._queue = queue
+
+    def run(self) -> None:
+        while True:
+            item = self._queue.get()
+            start = monotonic()
+            stage_latency.record("queue", start - item.enqueued)
+            try:
+                with tracer.item(item.stream, item.post.id):
+                    tracer.complete("queue", item.enqueued, start)
+                    with stage_latency.time(item.stream):
+                        item.process(item.post)
+            except Exception as e:
+                self._logger.error(f"{item.post.id}: exception in worker", exc_info=e)
+                thread_exceptions.inc(self.name)
+            finally:
+                self._queue.task_done()
+
+
+class Pipeline:
+    """Work queue drained by a pool of workers, periodically logging its depth and latencies."""
+
+    REPORT_INTERVAL = 5 * 60
+
+    def __init__(self, workers: int, maxsize: int, policy: DropPolicy) -> None:
+        self._logger = logging.getLogger(__name__)
+        self.queue = WorkQueue(maxsize, policy)
+        self._workers = [Worker(self.queue, i) for i in range(workers)]
+        self._reporter = Thread(target=self._report, name="pipeline", daemon=True)
+        self._stopped = Event()
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+        self._reporter.start()
+
+    def stop(self) -> None:
+        """Stops the reporter. Workers are daemons, so they stop with the process."""
+        self._stopped.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.queue.depth(),
+            "dropped": self.queue.dropped,
+            "latency": stage_latency.stats(),
+        }
+
+    def _report(self) -> None:
+        while not self._stopped.wait(self.REPORT_INTERVAL):
+            self._logger.info(f"Stats: {self.stats()}")
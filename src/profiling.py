@@ -0,0 +1,175 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+# Profiling hooks cheap enough to leave on in production: a sampling profiler that costs nothing
+# until triggered, and per-item trace spans written for a sampled fraction of items
+import atexit
+from collections import Counter
+from contextlib import contextmanager
+import json
+import logging
+import os
+from random import random
+import sys
+from threading import (
+    Lock,
+    Thread,
+    current_thread,
+    enumerate as threads,
+    get_ident,
+    local,
+)
+from time import monotonic, sleep, strftime
+from typing import IO, Iterator
+
+_logger = logging.getLogger(__name__)
+# Whether the item each thread is working on is sampled for tracing
+_state = local()
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    # Semicolons separate frames in the collapsed format
+    return f"{module}.{code.co_qualname}:{frame.f_lineno}".replace(";", ":")
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler across every thread. Samples sys._current_frames at an interval
+    for a bounded duration and counts stacks in the collapsed format read by flame graph tools,
+    one "thread;outermost;...;innermost count" line per distinct stack. Frames blocked on I/O or
+    waiting for the GIL or a lock are sampled too, so the profile shows where time goes, not only
+    CPU. Nothing runs between profiles, and only one profile runs at a time.
+    """
+
+    MAX_SECONDS = 120
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self._interval = interval
+        self._lock = Lock()
+
+    def profile(self, seconds: float) -> str:
+        seconds = min(seconds, self.MAX_SECONDS)
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            stacks: Counter = Counter()
+            me = get_ident()
+            deadline = monotonic() + seconds
+            while monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threads()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)))
+                    stacks[";".join(reversed(stack))] += 1
+                sleep(self._interval)
+        finally:
+            self._lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def dump(self, seconds: float, directory: str) -> None:
+        """Profiles on a background thread, then writes the result to a file in directory."""
+
+        def run() -> None:
+            path = os.path.join(
+                directory, f"profile-{strftime('%Y%m%dT%H%M%S')}.folded"
+            )
+            try:
+                result = self.profile(seconds)
+                with open(path, "w") as file:
+                    file.write(result)
+                _logger.info(f"Wrote profile [{path}]")
+            except Exception as e:
+                _logger.error("Failed to profile", exc_info=e)
+
+        _logger.info(f"Profiling for {seconds}s")
+        Thread(target=run, name="profiler", daemon=True).start()
+
+
+class Tracer:
+    """
+    Writes spans in the Chrome Trace Event format, which Perfetto and chrome://tracing open.
+    Each item is sampled once when it starts, then every span inside it on the same thread is
+    written if it was sampled. Until configured, or for unsampled items, spans cost one check.
+    The file is closed on stop or at exit.
+    """
+
+    def __init__(self) -> None:
+        self._file: IO[str] | None = None
+        self._rate = 0.0
+        self._lock = Lock()
+        self._named: set = set()
+
+    # Post-initialization, remove when globals are removed
+    def configure(self, path: str, rate: float) -> None:
+        # The JSON array format may be left unterminated, so events are appended as they end.
+        # The file stays open until stop
+        self._file = open(path, "w", buffering=1)  # noqa: SIM115
+        self._file.write("[\n")
+        self._rate = rate
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, event: dict) -> None:
+        ident = get_ident()
+        with self._lock:
+            # Stopped while the item was in progress
+            if self._file is None:
+                return
+            if ident not in self._named:
+                self._named.add(ident)
+                metadata = {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": ident,
+                    "args": {"name": current_thread().name},
+                }
+                self._file.write(json.dumps(metadata) + ",\n")
+            self._file.write(json.dumps(event) + ",\n")
+
+    def complete(self, name: str, start: float, end: float, **args: str) -> None:
+        """Records a span between two monotonic times, if inside a sampled item."""
+        if not getattr(_state, "sampled", False):
+            return
+        self._write(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": int(start * 1e6),
+                "dur": int((end - start) * 1e6),
+                "pid": os.getpid(),
+                "tid": get_ident(),
+                "args": args,
+            }
+        )
+
+    @contextmanager
+    def item(self, name: str, id: str) -> Iterator[None]:
+        """Samples an item and, if chosen, traces it and every span within it."""
+        if self._file is None:
+            yield
+            return
+        outer = getattr(_state, "sampled", False)
+        _state.sampled = random() < self._rate
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.complete(name, start, monotonic(), id=id)
+            _state.sampled = outer
+
+
+# Globals, to eventually remove
+profiler = SamplingProfiler()
+tracer = Tracer()
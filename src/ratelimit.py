@@ -0,0 +1,78 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+from enum import IntEnum
+import logging
+from threading import Condition
+from time import monotonic
+from typing import ClassVar, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import praw
+
+
+class Priority(IntEnum):
+    REPLY = 0
+    DEDUP = 1
+    POLL = 2
+
+
+class RateBudget:
+    """
+    Token bucket over the account's Reddit API quota, shared by every thread using one client.
+    The bucket refills evenly over Reddit's rate limit window and is corrected downwards from the
+    X-Ratelimit headers that PRAW records. Each priority must leave a share of the quota in reserve
+    for the higher priorities, so when the quota is tight polling waits first, then dedup checks,
+    and replies keep going. Shards of one account each get an equal share of the quota.
+    """
+
+    # https://support.reddithelp.com/hc/en-us/articles/16160319875092-Reddit-Data-API-Wiki
+    WINDOW = 600
+    CAPACITY = 1000
+    RESERVE: ClassVar[Dict[Priority, float]] = {
+        Priority.REPLY: 0,
+        Priority.DEDUP: 0.05,
+        Priority.POLL: 0.25,
+    }
+
+    def __init__(self, reddit: "praw.Reddit", shares: int = 1) -> None:
+        self._logger = logging.getLogger(__name__)
+        self._reddit = reddit
+        self._capacity = self.CAPACITY / shares
+        self._condition = Condition()
+        self._tokens = self._capacity
+        self._refilled = monotonic()
+        self._last_limits: tuple | None = None
+        self.waited: Dict[Priority, float] = {priority: 0.0 for priority in Priority}
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(
+            self._capacity,
+            self._tokens + (now - self._refilled) * self._capacity / self.WINDOW,
+        )
+        self._refilled = now
+        limits = self._reddit.auth.limits
+        current = (limits.get("remaining"), limits.get("used"))
+        # Only fresh headers are informative; a stale count would starve the bucket
+        if current != self._last_limits and current[0] is not None:
+            self._tokens = min(self._tokens, current[0])
+        self._last_limits = current
+
+    def headroom(self) -> float:
+        with self._condition:
+            self._refill()
+            return self._tokens
+
+    def acquire(self, priority: Priority, cost: int = 1) -> None:
+        """Blocks until the request can be made without eating into a higher priority's reserve."""
+        threshold = self.RESERVE[priority] * self._capacity + cost
+        start = monotonic()
+        with self._condition:
+            self._refill()
+            while self._tokens < threshold:
+                wait = (threshold - self._tokens) * self.WINDOW / self._capacity
+                self._logger.info(f"{priority.name}: waiting {wait:.1f}s for quota")
+                self._condition.wait(wait)
+                self._refill()
+            self._tokens -= cost
+        self.waited[priority] += monotonic() - start
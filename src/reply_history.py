@@ -0,0 +1,109 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import logging
+from threading import Event, Thread
+from time import time
+from typing import TYPE_CHECKING
+
+from metrics import thread_exceptions
+from ratelimit import Priority
+from store import Store
+
+if TYPE_CHECKING:
+    import praw
+
+    from ratelimit import RateBudget
+
+
+class ReplyHistoryScanner(Thread):
+    """
+    Records what the account's own recent comments replied to, so that whether a submission or
+    comment has been replied to can be answered from the store without loading comment forests.
+    This also covers replies the store never saw, such as those made before it existed or by
+    another instance. Each scan reads the account's comments newest first and stops at the
+    newest comment the previous scan recorded. Reddit lists at most LIMIT comments, so when a
+    scan cannot reach back that far, the history is only complete from the oldest one it read.
+    """
+
+    # Store meta key for the fullname of the newest comment recorded, set after the first scan
+    KEY = "reply_history"
+    # Store meta key for the time the history is complete from
+    SINCE_KEY = "reply_history_since"
+    # The most a listing returns
+    LIMIT = 1000
+    PAGE = 100
+
+    def __init__(
+        self,
+        reddit: "praw.Reddit",
+        budget: "RateBudget",
+        store: "Store",
+        interval: float = 10 * 60,
+    ) -> None:
+        super().__init__(name="reply-history", daemon=True)
+        self._logger = logging.getLogger(self.name)
+        self._reddit = reddit
+        self._budget = budget
+        self._store = store
+        self._interval = interval
+        self._stopped = Event()
+
+    def scan(self) -> int:
+        """Records the targets of comments since the last scan and returns how many."""
+        since = self._store.get_meta(self.SINCE_KEY)
+        # Without a horizon, as in stores scanned before it was recorded, start over
+        newest_recorded = self._store.get_meta(self.KEY) if since is not None else None
+        newest = None
+        oldest_created = None
+        replies = []
+        caught_up = False
+        self._budget.acquire(Priority.POLL)
+        listing = self._reddit.user.me().comments.new(limit=self.LIMIT)
+        for i, comment in enumerate(listing, 1):
+            if comment.fullname == newest_recorded:
+                caught_up = True
+                break
+            newest = newest or comment.fullname
+            oldest_created = comment.created_utc
+            replies.append((comment.parent_id, comment.fullname))
+            # The listing fetches the next page lazily
+            if i % self.PAGE == 0:
+                self._budget.acquire(Priority.POLL)
+        self._store.mark_replied_many(replies)
+        if not caught_up and len(replies) == self.LIMIT:
+            # Older comments, or those between this scan and the last, were not listed
+            self._store.set_meta(self.SINCE_KEY, str(oldest_created))
+        elif since is None:
+            # The whole history was listed, possibly nothing at all
+            self._store.set_meta(self.SINCE_KEY, "0")
+        if newest is not None:
+            self._store.set_meta(self.KEY, newest)
+        elif newest_recorded is None:
+            self._store.set_meta(self.KEY, "")
+        self._logger.info(f"Recorded {len(replies)} replies")
+        return len(replies)
+
+    def run(self) -> None:
+        while True:
+            try:
+                self.scan()
+            except Exception as e:
+                self._logger.error("Exception in thread", exc_info=e)
+                thread_exceptions.inc(self.name)
+            if self._stopped.wait(self._interval):
+                return
+
+    def cancel(self) -> None:
+        self._stopped.set()
+
+
+def history_covers(store: Store, created_utc: float) -> bool:
+    """
+    Whether the store holds any reply the account made to a post created at created_utc, so a
+    miss from has_replied is reliable. Replies to older posts may predate the scanned history
+    or have been compacted away.
+    """
+    since = store.get_meta(ReplyHistoryScanner.SINCE_KEY)
+    if since is None or store.get_meta(ReplyHistoryScanner.KEY) is None:
+        return False
+    return created_utc >= max(float(since), time() - Store.MAX_AGE)
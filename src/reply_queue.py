@@ -0,0 +1,269 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import logging
+import re
+from threading import Condition, Thread
+from time import time
+from typing import Dict, List, Sequence, Tuple, Union, TYPE_CHECKING
+
+from prawcore import Forbidden, PrawcoreException
+from praw.exceptions import RedditAPIException
+
+from footer import TOO_LONG
+from metrics import reply_seconds, thread_exceptions
+from ratelimit import Priority
+from startup import milestone
+
+if TYPE_CHECKING:
+    import praw
+    from praw.exceptions import RedditErrorItem
+    from praw.models import Comment, Submission
+
+    from ratelimit import RateBudget
+    from store import PendingReply, Store
+
+
+# "Looks like you've been doing that a lot. Take a break for 5 minutes before trying again."
+ratelimit_regex = re.compile(r"(\d+) (second|minute)")
+
+
+# Recorded as the reply when Reddit posts a comment without returning it, as PRAW documents for
+# quarantined subreddits. The reply history scan replaces it with the real fullname
+UNKNOWN_REPLY = "unknown"
+
+
+def parse_ratelimit(message: str) -> float | None:
+    """Returns the seconds to wait from a RATELIMIT error message, if given."""
+    match = ratelimit_regex.search(message)
+    if match is None:
+        return None
+    amount = int(match.group(1))
+    return amount * 60 if match.group(2) == "minute" else amount
+
+
+class ReplyQueue:
+    """
+    Queue of replies shared by every runtime. The queue is persisted in the store and
+    deduplicated by target, so pending replies survive restarts. Sends that Reddit rate limits
+    are deferred by the requested time for as long as it takes, and other transient failures are
+    retried with exponential backoff up to MAX_ATTEMPTS. Subclasses do the sending.
+    """
+
+    MAX_ATTEMPTS = 6
+    BACKOFF = 30
+    # Long enough for any send to finish, so that shards never send the same reply concurrently
+    LEASE = 10 * 60
+
+    def __init__(self, budget: "RateBudget", store: "Store") -> None:
+        self._logger = logging.getLogger("replies")
+        self._budget = budget
+        self._store = store
+        self.sent = 0
+        self.deferred = 0
+        self.dropped = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def enqueue(
+        self, target: Union["Comment", "Submission"], text: str, *continuation: str
+    ) -> None:
+        """Queues text as a reply to target, then each continuation as a reply to the last."""
+        # Top-level replies to submissions are deduplicated separately
+        submission_id = target.submission.id if hasattr(target, "submission") else None
+        if self._store.add_pending_reply(
+            target.fullname, submission_id, text, continuation
+        ):
+            self._logger.info(f"{target.id}: reply queued")
+            self._notify()
+        else:
+            self._logger.info(f"{target.id}: reply already queued")
+
+    def _notify(self) -> None:
+        """Wakes the sender for a newly queued reply."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "pending": self._store.pending_reply_count(),
+            "sent": self.sent,
+            "deferred": self.deferred,
+            "dropped": self.dropped,
+            "mean_wait": self.total_wait / self.sent if self.sent else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    def _defer(
+        self,
+        pending: "PendingReply",
+        delay: float,
+        text: str,
+        attempt: bool = True,
+        continuation: Sequence[str] | None = None,
+    ) -> None:
+        """
+        Retries pending after delay with text, and continuation if not None. Only retries that
+        are an attempt count towards MAX_ATTEMPTS, so rate limits are waited out however long.
+        """
+        if attempt and pending.attempts + 1 >= self.MAX_ATTEMPTS:
+            self._logger.error(
+                f"{pending.target}: dropped after {pending.attempts + 1} attempts"
+            )
+            self._store.remove_pending_reply(pending.target)
+            self.dropped += 1
+            return
+        self._logger.warning(f"{pending.target}: retrying in {delay}s")
+        self._store.defer_pending_reply(
+            pending.target, time() + delay, text, attempt, continuation
+        )
+        self.deferred += 1
+
+    def _already_sent(self, pending: "PendingReply") -> bool:
+        # A reply deferred or leased before a restart may have been posted after all
+        if self._store.has_replied(pending.target):
+            self._logger.info(f"{pending.target}: skip, already replied")
+            self._store.remove_pending_reply(pending.target)
+            return True
+        return False
+
+    def _forbidden(self, pending: "PendingReply", e: Exception) -> None:
+        self._logger.warning(f"{pending.target}: reply forbidden", exc_info=e)
+        self._store.remove_pending_reply(pending.target)
+
+    def _rejected(
+        self, pending: "PendingReply", items: List["RedditErrorItem"], e: Exception
+    ) -> None:
+        """Handles the error items of a RedditAPIException from either PRAW."""
+        for item in items:
+            if item.error_type == "RATELIMIT":
+                delay = parse_ratelimit(item.message) or self._backoff(pending)
+                self._defer(pending, max(delay, 1), pending.text, attempt=False)
+                return
+            if item.error_type == "TOO_LONG":
+                self._logger.warning(f"{pending.target}: reply too long", exc_info=e)
+                # The apology replaces every page
+                self._defer(pending, 0, TOO_LONG, continuation=[])
+                return
+        self._logger.error(f"{pending.target}: reply failure", exc_info=e)
+        self._store.remove_pending_reply(pending.target)
+
+    def _failed(self, pending: "PendingReply", e: Exception) -> None:
+        self._logger.warning(f"{pending.target}: reply failed", exc_info=e)
+        self._defer(pending, self._backoff(pending), pending.text)
+
+    def _backoff(self, pending: "PendingReply") -> float:
+        return self.BACKOFF * 2**pending.attempts
+
+    def _posted(self, pending: "PendingReply", reply_fullname: str | None) -> None:
+        """
+        Records a posted reply, whose fullname is None if Reddit did not return it. The pending
+        reply is removed even if recording fails, since sending it again would post it twice.
+        """
+        wait = time() - pending.enqueued
+        try:
+            if reply_fullname is None:
+                self._logger.warning(
+                    f"{pending.target}: posted reply not returned after {wait:.1f}s queued"
+                )
+            else:
+                self._logger.info(
+                    f"{pending.target}: posted reply {reply_fullname} after {wait:.1f}s queued"
+                )
+            # Recorded before the pending reply is removed, so a crash in between cannot repost it
+            self._store.mark_replied(pending.target, reply_fullname or UNKNOWN_REPLY)
+            if pending.submission_id is not None:
+                self._store.increment_reply_count(pending.submission_id)
+            if pending.continuation and reply_fullname is None:
+                pages = len(pending.continuation)
+                self._logger.warning(
+                    f"{pending.target}: {pages} pages dropped, no reply"
+                )
+            elif pending.continuation:
+                # Later pages answer the same summons, so they do not count towards the limit again
+                self._store.add_pending_reply(
+                    reply_fullname,
+                    None,
+                    pending.continuation[0],
+                    pending.continuation[1:],
+                )
+        finally:
+            self._store.remove_pending_reply(pending.target)
+        self.sent += 1
+        milestone("first_reply")
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def _due(self) -> Tuple["PendingReply | None", float | None]:
+        """Returns the next pending reply if it is due and leased, else how long to wait."""
+        pending = self._store.next_pending_reply()
+        if pending is None:
+            return None, None
+        delay = pending.not_before - time()
+        if delay > 0:
+            return None, delay
+        if not self._store.lease_pending_reply(
+            pending.target, pending.not_before, time() + self.LEASE
+        ):
+            return None, 0
+        return pending, None
+
+
+class ReplySender(ReplyQueue, Thread):
+    """Sends queued replies for the threaded runtime."""
+
+    def __init__(
+        self, reddit: "praw.Reddit", budget: "RateBudget", store: "Store"
+    ) -> None:
+        Thread.__init__(self, name="replies", daemon=True)
+        ReplyQueue.__init__(self, budget, store)
+        self._reddit = reddit
+        self._condition = Condition()
+
+    def _notify(self) -> None:
+        with self._condition:
+            self._condition.notify()
+
+    def _resolve(self, fullname: str) -> Union["Comment", "Submission"]:
+        # Lazy objects, so no request is made to build them
+        kind, id = fullname.split("_", 1)
+        if kind == self._reddit.config.kinds["submission"]:
+            return self._reddit.submission(id)
+        return self._reddit.comment(id)
+
+    def _send(self, pending: "PendingReply") -> None:
+        if self._already_sent(pending):
+            return
+        target = self._resolve(pending.target)
+        # Posting and disabling inbox replies
+        self._budget.acquire(Priority.REPLY, 2)
+        try:
+            with reply_seconds.time():
+                reply: "Comment | None" = target.reply(pending.text)
+        except Forbidden as e:
+            self._forbidden(pending, e)
+            return
+        except RedditAPIException as e:
+            self._rejected(pending, e.items, e)
+            return
+        except PrawcoreException as e:
+            self._failed(pending, e)
+            return
+        self._posted(pending, None if reply is None else reply.fullname)
+        if reply is not None:
+            reply.disable_inbox_replies()
+
+    def run(self) -> None:
+        while True:
+            try:
+                # Held while checking so that a notification from enqueue cannot be missed
+                with self._condition:
+                    pending, delay = self._due()
+                    if pending is None:
+                        if delay != 0:
+                            self._condition.wait(delay)
+                        continue
+                self._send(pending)
+            except Exception as e:
+                self._logger.error("Exception in thread", exc_info=e)
+                thread_exceptions.inc(self.name)
+                with self._condition:
+                    self._condition.wait(self.BACKOFF)
@@ -0,0 +1,38 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+# Sharded deployments run one process per shard against the same Reddit account and database.
+# Every shard has the full SUBREDDITS and the same SHARD_COUNT, which also splits the account's
+# API quota, and streams the subreddits dealt to its SHARD_INDEX.
+from os import getenv
+from typing import List
+
+
+def all_subreddits() -> List[str]:
+    """Every subreddit the bot serves across all shards, lowercased."""
+    return [name.lower() for name in getenv("SUBREDDITS", "").split("+") if name]
+
+
+def shard_count() -> int:
+    return int(getenv("SHARD_COUNT", "1"))
+
+
+def shard_index() -> int:
+    count, index = shard_count(), int(getenv("SHARD_INDEX", "0"))
+    if not 0 <= index < count:
+        raise ValueError(f"SHARD_INDEX {index} is not within SHARD_COUNT {count}")
+    return index
+
+
+def owns(subreddit: str) -> bool:
+    """
+    Whether this shard streams subreddit. With SHARD_COUNT set, sorted names are dealt
+    round-robin, so every shard agrees without coordinating.
+    """
+    names = sorted(all_subreddits())
+    name = subreddit.lower()
+    return name in names and names.index(name) % shard_count() == shard_index()
+
+
+def shard_subreddits() -> str:
+    """The subreddits this shard streams, joined for Reddit.subreddit."""
+    return "+".join(name for name in sorted(all_subreddits()) if owns(name))
@@ -0,0 +1,27 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import logging
+from threading import Lock
+from time import monotonic
+from typing import Dict
+
+# Measured from when the bot first imports this module, close to process start
+started = monotonic()
+
+_logger = logging.getLogger(__name__)
+_lock = Lock()
+_milestones: Dict[str, float] = {}
+
+
+def milestone(name: str) -> None:
+    """Records the seconds since startup the first time name is reached, e.g. first_reply."""
+    with _lock:
+        if name in _milestones:
+            return
+        _milestones[name] = seconds = monotonic() - started
+    _logger.info(f"Startup: {name} after {seconds:.3f}s")
+
+
+def milestones() -> Dict[str, float]:
+    with _lock:
+        return dict(_milestones)
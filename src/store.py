@@ -0,0 +1,335 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import json
+import logging
+import sqlite3
+from threading import Lock
+from time import time
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
+
+
+class PendingReply(NamedTuple):
+    target: str
+    submission_id: str | None
+    text: str
+    enqueued: float
+    not_before: float
+    attempts: int
+    # Further comments to chain as replies to this one
+    continuation: List[str]
+
+
+class Store:
+    """
+    Local state that survives restarts, shared by all threads and by every shard's process.
+    Records the fullnames of submissions and comments that have been processed and the replies
+    made to them, so that replayed stream items can be skipped without spending Reddit API calls,
+    counts replies per submission, holds replies waiting to be sent, and keeps small named values
+    such as scan positions.
+    """
+
+    # Records older than this are compacted away. Streams only replay the last ~100 items.
+    MAX_AGE = 7 * 24 * 60 * 60
+    COMPACT_INTERVAL = 60 * 60
+    # Seconds to wait for another process to release the database
+    BUSY_TIMEOUT = 30
+    # PRAGMA user_version of the current schema
+    VERSION = 1
+
+    def __init__(self, path: str) -> None:
+        self._logger = logging.getLogger(__name__)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            path,
+            timeout=self.BUSY_TIMEOUT,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                id TEXT PRIMARY KEY,
+                reply_id TEXT,
+                processed INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS items_updated ON items (updated)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS items_reply_id ON items (reply_id)"
+        )
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reply_counts (
+                submission_id TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                updated REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS reply_counts_updated ON reply_counts (updated)"
+        )
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_replies (
+                target TEXT PRIMARY KEY,
+                submission_id TEXT,
+                text TEXT NOT NULL,
+                enqueued REAL NOT NULL,
+                not_before REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                continuation TEXT NOT NULL DEFAULT '[]'
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._migrate()
+        self._last_compacted = 0.0
+        self.compact()
+
+    def _migrate(self) -> None:
+        # Checked again under the write lock, since every shard migrates on startup
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            (version,) = self._connection.execute("PRAGMA user_version").fetchone()
+            if version < 1:
+                # Items were keyed by bare ID, which a submission and a comment can share.
+                # Which one each was is unknown, so both fullnames are kept until they age out
+                self._connection.execute(
+                    """
+                    INSERT OR IGNORE INTO items (id, reply_id, processed, updated)
+                    SELECT kind || id, 't1_' || reply_id, processed, updated
+                    FROM items, (SELECT 't1_' AS kind UNION ALL SELECT 't3_')
+                    WHERE instr(id, '_') = 0
+                    """
+                )
+                self._connection.execute("DELETE FROM items WHERE instr(id, '_') = 0")
+                self._connection.execute("DELETE FROM meta WHERE key = 'reply_history'")
+            self._connection.execute(f"PRAGMA user_version = {self.VERSION}")
+            self._connection.execute("COMMIT")
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+
+    def is_processed(self, fullname: str) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT processed FROM items WHERE id = ?", (fullname,)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def mark_processed(self, fullname: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT INTO items (id, processed, updated) VALUES (?, 1, ?)
+                ON CONFLICT (id) DO UPDATE SET processed = 1, updated = excluded.updated
+                """,
+                (fullname, time()),
+            )
+        if time() - self._last_compacted > self.COMPACT_INTERVAL:
+            self.compact()
+
+    def claim(self, fullname: str) -> bool:
+        """Marks fullname processed, returning False if it already was, so one shard handles it."""
+        with self._lock:
+            claimed = self._connection.execute(
+                """
+                INSERT INTO items (id, processed, updated) VALUES (?, 1, ?)
+                ON CONFLICT (id) DO UPDATE SET processed = 1, updated = excluded.updated
+                WHERE processed = 0
+                """,
+                (fullname, time()),
+            ).rowcount
+        if time() - self._last_compacted > self.COMPACT_INTERVAL:
+            self.compact()
+        return bool(claimed)
+
+    def has_replied(self, fullname: str) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT reply_id FROM items WHERE id = ?", (fullname,)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def mark_replied(self, fullname: str, reply: str) -> None:
+        """Records that the comment with fullname reply was posted in reply to fullname."""
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT INTO items (id, reply_id, updated) VALUES (?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET reply_id = excluded.reply_id, updated = excluded.updated
+                """,
+                (fullname, reply, time()),
+            )
+
+    def is_my_reply(self, fullname: str) -> bool:
+        """Whether fullname is a comment we posted, as recorded by mark_replied."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM items WHERE reply_id = ?", (fullname,)
+            ).fetchone()
+        return row is not None
+
+    def mark_replied_many(self, replies: Iterable[Tuple[str, str]]) -> None:
+        """Like mark_replied for (fullname, reply) pairs, in one transaction."""
+        now = time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    """
+                    INSERT INTO items (id, reply_id, updated) VALUES (?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET reply_id = excluded.reply_id, updated = excluded.updated
+                    """,
+                    ((fullname, reply, now) for fullname, reply in replies),
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def get_meta(self, key: str) -> str | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def reply_count(self, submission_id: str) -> int:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT count FROM reply_counts WHERE submission_id = ?",
+                (submission_id,),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def increment_reply_count(self, submission_id: str) -> int:
+        with self._lock:
+            (count,) = self._connection.execute(
+                """
+                INSERT INTO reply_counts (submission_id, count, updated) VALUES (?, 1, ?)
+                ON CONFLICT (submission_id) DO UPDATE SET count = count + 1, updated = excluded.updated
+                RETURNING count
+                """,
+                (submission_id, time()),
+            ).fetchone()
+        return count
+
+    def add_pending_reply(
+        self,
+        target: str,
+        submission_id: str | None,
+        text: str,
+        continuation: Sequence[str] = (),
+    ) -> bool:
+        """Returns False if a reply to target fullname is already pending."""
+        now = time()
+        with self._lock:
+            return bool(
+                self._connection.execute(
+                    """
+                    INSERT OR IGNORE INTO pending_replies
+                    (target, submission_id, text, enqueued, not_before, continuation)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (target, submission_id, text, now, now, json.dumps(continuation)),
+                ).rowcount
+            )
+
+    def next_pending_reply(self) -> PendingReply | None:
+        with self._lock:
+            row = self._connection.execute(
+                """
+                SELECT target, submission_id, text, enqueued, not_before, attempts, continuation
+                FROM pending_replies ORDER BY not_before LIMIT 1
+                """
+            ).fetchone()
+        return PendingReply(*row[:-1], json.loads(row[-1])) if row else None
+
+    def lease_pending_reply(self, target: str, not_before: float, until: float) -> bool:
+        """
+        Postpones a due pending reply to until, unless another shard did first. Returns whether
+        this caller now holds it. If the holder dies before sending, the reply is retried after.
+        """
+        with self._lock:
+            return bool(
+                self._connection.execute(
+                    """
+                    UPDATE pending_replies SET not_before = ?
+                    WHERE target = ? AND not_before = ?
+                    """,
+                    (until, target, not_before),
+                ).rowcount
+            )
+
+    def defer_pending_reply(
+        self,
+        target: str,
+        not_before: float,
+        text: str,
+        attempt: bool = True,
+        continuation: Sequence[str] | None = None,
+    ) -> None:
+        """Reschedules a pending reply, replacing its continuation unless None."""
+        with self._lock:
+            self._connection.execute(
+                """
+                UPDATE pending_replies
+                SET not_before = ?, text = ?, attempts = attempts + ?,
+                    continuation = COALESCE(?, continuation)
+                WHERE target = ?
+                """,
+                (
+                    not_before,
+                    text,
+                    int(attempt),
+                    None if continuation is None else json.dumps(continuation),
+                    target,
+                ),
+            )
+
+    def remove_pending_reply(self, target: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM pending_replies WHERE target = ?", (target,)
+            )
+
+    def pending_reply_count(self, submission_id: str | None = None) -> int:
+        with self._lock:
+            if submission_id is None:
+                row = self._connection.execute(
+                    "SELECT COUNT(*) FROM pending_replies"
+                ).fetchone()
+            else:
+                row = self._connection.execute(
+                    "SELECT COUNT(*) FROM pending_replies WHERE submission_id = ?",
+                    (submission_id,),
+                ).fetchone()
+        return row[0]
+
+    def compact(self) -> None:
+        """Deletes records and reply counts not touched within MAX_AGE."""
+        self._last_compacted = time()
+        cutoff = time() - self.MAX_AGE
+        with self._lock:
+            deleted = self._connection.execute(
+                "DELETE FROM items WHERE updated < ?", (cutoff,)
+            ).rowcount
+            deleted += self._connection.execute(
+                "DELETE FROM reply_counts WHERE updated < ?", (cutoff,)
+            ).rowcount
+        self._logger.info(f"Compacted {deleted} records")
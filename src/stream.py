@@ -1,93 +1,174 @@
 # SPDX-FileCopyrightText: © 2023–2024 Kevin Lu, Luna Brand
 # SPDX-Licence-Identifier: AGPL-3.0-or-later
 from abc import abstractmethod
-from os import getenv
-from typing import Generator, Generic, List, TypeVar, TYPE_CHECKING
+from typing import Any, Callable, Generator, Generic, List, TypeVar, TYPE_CHECKING
+
+from praw.models.util import stream_generator
 
 from antiabuse import (
     already_replied_to_comment,
     already_replied_to_submission,
-    is_author_me,
-    is_summon_chain,
+    my_name,
 )
-from card import parse_summons, get_cards, display_cards
-from bot_thread import BotThread, timestamp_to_iso
+from card import display_cards, get_cards, may_have_summons, summarize_cards
+from filters import comment_summons, replied_locally, submission_summons
+from logs import Lazy, SAMPLED, timestamp_to_iso
+from bot_thread import BotThread
+from metrics import items_seen, prefilter_rejected, summons_parsed
+from pipeline import stage_latency
+from shard import shard_subreddits
 
 if TYPE_CHECKING:
     import httpx
+    import praw
     from praw.models import Comment, Submission
 
+    from pipeline import WorkQueue
+    from ratelimit import RateBudget
+    from reply_queue import ReplySender
+    from store import Store
+
 
 Post = TypeVar("Post", "Comment", "Submission")
 
 
 class StreamThread(Generic[Post], BotThread):
+    @abstractmethod
+    def _text(self, post: Post) -> str:
+        """The text summons are parsed from, already loaded with the listing."""
+        raise NotImplementedError
+
     @abstractmethod
     def _parse_summons(self, post: Post) -> List[str]:
         raise NotImplementedError
 
+    @abstractmethod
+    def _is_duplicate(self, post: Post) -> bool:
+        """Whether to skip a post with summons, because it was answered or to prevent looping."""
+        raise NotImplementedError
+
     def _main_loop(self, stream: Generator[Post, None, None]):
         for post in stream:
-            self._logger.info(
-                f"{post.id}|{post.permalink}|{timestamp_to_iso(post.created_utc)}"
-            )
+            items_seen.inc(self.name)
+            # Nearly all items have no summon, so reject them before touching anything else
+            if not may_have_summons(self._text(post)):
+                prefilter_rejected.inc(self.name)
+                continue
+            if self._store.is_processed(post.fullname):
+                self._logger.info("%s: skip, processed", post.id, extra=SAMPLED)
+                continue
+            self._enqueue(post, self._process)
+
+    def _already_replied(self, post: Post, check: Callable[[Any], bool]) -> bool:
+        """
+        Answered by the store once it holds the account's reply history back to when post was
+        created. Otherwise, a miss falls back to check, which loads comments from Reddit.
+        """
+        replied = replied_locally(self._store, post)
+        if replied is None:
+            replied = self._checked(check, post)
+        return replied
+
+    # Runs on a worker thread
+    def _process(self, post: Post) -> None:
+        self._logger.info(
+            "%s",
+            Lazy(
+                lambda: (
+                    f"{post.id}|{post.permalink}|{timestamp_to_iso(post.created_utc)}"
+                )
+            ),
+            extra=SAMPLED,
+        )
+        with stage_latency.time("parse"):
             summons = self._parse_summons(post)
-            if len(summons):
+        if len(summons):
+            with stage_latency.time("dedup"):
+                if self._is_duplicate(post):
+                    summons = []
+        summons_parsed.inc(self.name, amount=len(summons))
+        if len(summons):
+            with stage_latency.time("lookup"):
                 cards = get_cards(self._client, summons)
-                self._logger.info(f"{post.id}| cards: {cards}")
-                if len(cards):
-                    reply = display_cards(cards)
-                    self._reply(post, reply)
+            self._logger.info(f"{post.id}| cards: {summarize_cards(cards)}")
+            if len(cards):
+                with stage_latency.time("render"):
+                    pages = display_cards(cards)
+                with stage_latency.time("reply"):
+                    self._reply(post, *pages)
+        self._store.mark_processed(post.fullname)
 
 
 class SubmissionsThread(StreamThread["Submission"]):
-    def __init__(self, api_client: "httpx.Client") -> None:
-        super().__init__(api_client, name="submissions")
+    def __init__(
+        self,
+        api_client: "httpx.Client",
+        reddit: "praw.Reddit",
+        budget: "RateBudget",
+        store: "Store",
+        work_queue: "WorkQueue",
+        replies: "ReplySender",
+    ) -> None:
+        super().__init__(
+            api_client, reddit, budget, store, work_queue, replies, name="submissions"
+        )
+
+    # @override
+    def _text(self, submission):
+        return submission.selftext
 
     # @override
     def _parse_summons(self, submission):
-        summons = parse_summons(submission.selftext)
-        self._logger.info(f"{submission.id}| summons: {summons}")
-        if len(summons) and already_replied_to_submission(submission):
+        return submission_summons(submission, self._logger)
+
+    # @override
+    def _is_duplicate(self, submission):
+        if self._already_replied(submission, already_replied_to_submission):
             self._logger.info(f"{submission.id}: skip, already replied")
-            return []
-        return summons
+            return True
+        return False
 
     # @override
     def _run(self) -> None:
-        subreddits = self._reddit.subreddit(getenv("SUBREDDITS"))
-        self._main_loop(subreddits.stream.submissions())
+        subreddits = self._reddit.subreddit(shard_subreddits())
+        self._main_loop(stream_generator(self._polled(subreddits.new)))
 
 
 class CommentsThread(StreamThread["Comment"]):
-    def __init__(self, api_client: "httpx.Client") -> None:
-        super().__init__(api_client, name="comments")
+    def __init__(
+        self,
+        api_client: "httpx.Client",
+        reddit: "praw.Reddit",
+        budget: "RateBudget",
+        store: "Store",
+        work_queue: "WorkQueue",
+        replies: "ReplySender",
+    ) -> None:
+        super().__init__(
+            api_client, reddit, budget, store, work_queue, replies, name="comments"
+        )
+
+    # @override
+    def _text(self, comment):
+        return comment.body
 
     # @override
     def _parse_summons(self, comment):
-        if is_author_me(comment):
-            self._logger.info(f"{comment.id}: skip, self")
-            return []
-        if (
-            self._reply_counter[comment.submission.id]
-            >= self.MAX_REPLIES_PER_SUBMISSION
-        ):
-            self._logger.warning(
-                f"{comment.id}: skip, exceeded limit for {comment.submission.id}"
-            )
-            return []
-        summons = parse_summons(comment.body)
-        self._logger.info(f"{comment.id}| summons: {summons}")
-        if len(summons):
-            if already_replied_to_comment(comment):
-                self._logger.info(f"{comment.id}: skip, already replied")
-                return []
-            if is_summon_chain(comment):
-                self._logger.info(f"{comment.id}: skip, parent comment is me")
-                return []
-        return summons
+        return comment_summons(
+            self._store, comment, my_name(self._reddit), self._logger
+        )
+
+    # @override
+    def _is_duplicate(self, comment):
+        if self._already_replied(comment, already_replied_to_comment):
+            self._logger.info(f"{comment.id}: skip, already replied")
+            return True
+        if self._summon_chains([comment.parent_id]):
+            self._logger.info(f"{comment.id}: skip, parent comment is me")
+            return True
+        return False
 
     # @override
     def _run(self) -> None:
-        subreddits = self._reddit.subreddit(getenv("SUBREDDITS"))
-        self._main_loop(subreddits.stream.comments())
+        subreddits = self._reddit.subreddit(shard_subreddits())
+        self._main_loop(stream_generator(self._polled(subreddits.comments)))
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+from types import SimpleNamespace
+
+import pytest
+
+import antiabuse
+from antiabuse import walk_summon_chains
+from cache import TTLCache
+
+ME = "BastionBotYuGiOh"
+
+
+@pytest.fixture(autouse=True)
+def ancestors(monkeypatch):
+    monkeypatch.setattr(
+        antiabuse, "_ancestors", TTLCache(maxsize=16, ttl=60, negative_ttl=0)
+    )
+
+
+@pytest.fixture
+def comments(store):
+    # Bastion replied to t3_s; t1_human and t1_bot reply to Bastion
+    store.mark_replied("t3_s", "t1_bastion")
+    things = {
+        "t1_human": ("human", "t1_bastion", "Thanks! What about the other one?"),
+        "t1_bot": ("otherbot", "t1_bastion", "{{Dark Magician}}"),
+    }
+    return {
+        fullname: SimpleNamespace(
+            fullname=fullname,
+            author=SimpleNamespace(name=author),
+            parent_id=parent,
+            body=body,
+        )
+        for fullname, (author, parent, body) in things.items()
+    }
+
+
+def walk(store, comments, parents):
+    fetched = []
+    walk = walk_summon_chains(ME, store, parents)
+    try:
+        unknown = next(walk)
+        while True:
+            fetched.append(unknown)
+            unknown = walk.send([comments[fullname] for fullname in unknown])
+    except StopIteration as stop:
+        return stop.value, fetched
+
+
+def test_reply_to_me(store, comments):
+    chained, fetched = walk(store, comments, ["t1_bastion"])
+    assert chained == {"t1_bastion"}
+    assert fetched == []
+
+
+def test_human_reply_to_human_under_me(store, comments):
+    # A person summoning in reply to another person's reply to Bastion is answered
+    chained, fetched = walk(store, comments, ["t1_human"])
+    assert chained == set()
+    assert fetched == [["t1_human"]]
+
+
+def test_reply_to_summoning_reply_under_me(store, comments):
+    chained, _ = walk(store, comments, ["t1_bot", "t1_human", "t3_s"])
+    assert chained == {"t1_bot"}
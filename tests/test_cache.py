@@ -0,0 +1,51 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import pytest
+
+import cache
+from cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache, "monotonic", lambda: now[0])
+    return now
+
+
+def test_expiry(clock):
+    ttl_cache = TTLCache(maxsize=4, ttl=60, negative_ttl=5)
+    ttl_cache.put("card", {"name": "card"})
+    ttl_cache.put("unknown", None)
+    clock[0] = 5
+    assert ttl_cache.lookup("card") == (True, {"name": "card"})
+    assert ttl_cache.lookup("unknown") == (True, None)
+    clock[0] = 6
+    assert ttl_cache.lookup("unknown") == (False, None)
+    clock[0] = 61
+    assert ttl_cache.lookup("card") == (False, None)
+    assert ttl_cache.expirations == 2
+    assert len(ttl_cache) == 0
+
+
+def test_lru_eviction(clock):
+    ttl_cache = TTLCache(maxsize=2, ttl=60, negative_ttl=5)
+    ttl_cache.put("a", 1)
+    ttl_cache.put("b", 2)
+    # Looking up a makes b the least recently used
+    ttl_cache.lookup("a")
+    ttl_cache.put("c", 3)
+    assert ttl_cache.lookup("b") == (False, None)
+    assert ttl_cache.lookup("a") == (True, 1)
+    assert ttl_cache.lookup("c") == (True, 3)
+    assert ttl_cache.evictions == 1
+
+
+def test_put_refreshes(clock):
+    ttl_cache = TTLCache(maxsize=2, ttl=60, negative_ttl=5)
+    ttl_cache.put("a", None)
+    clock[0] = 4
+    ttl_cache.put("a", 1)
+    clock[0] = 30
+    assert ttl_cache.lookup("a") == (True, 1)
+    assert ttl_cache.stats()["hits"] == 1
@@ -0,0 +1,10 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import pytest
+
+from pipeline import WorkQueue
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError, match="drop-oldest"):
+        WorkQueue(1, "drop-olde")
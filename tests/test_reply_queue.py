@@ -0,0 +1,87 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+from time import time
+
+import pytest
+
+from footer import TOO_LONG
+from reply_queue import ReplyQueue, parse_ratelimit
+
+
+@pytest.fixture
+def queue(store) -> ReplyQueue:
+    store.add_pending_reply("t1_a", "s", "first", ["second", "third"])
+    return ReplyQueue(None, store)
+
+
+def test_defer_counts_attempts(queue, store):
+    queue._defer(store.next_pending_reply(), 30, "first")
+    pending = store.next_pending_reply()
+    assert pending.attempts == 1
+    assert pending.not_before > time() + 20
+    assert pending.continuation == ["second", "third"]
+    assert queue.deferred == 1
+
+
+def test_defer_rate_limit_is_not_an_attempt(queue, store):
+    for _ in range(queue.MAX_ATTEMPTS + 1):
+        queue._defer(store.next_pending_reply(), 0, "first", attempt=False)
+    pending = store.next_pending_reply()
+    assert pending.attempts == 0
+    assert queue.dropped == 0
+
+
+def test_defer_drops_after_max_attempts(queue, store):
+    for _ in range(queue.MAX_ATTEMPTS - 1):
+        queue._defer(store.next_pending_reply(), 0, "first")
+    assert store.next_pending_reply().attempts == queue.MAX_ATTEMPTS - 1
+    queue._defer(store.next_pending_reply(), 0, "first")
+    assert store.next_pending_reply() is None
+    assert queue.dropped == 1
+
+
+def test_defer_replaces_text_and_continuation(queue, store):
+    queue._defer(store.next_pending_reply(), 0, TOO_LONG, continuation=[])
+    pending = store.next_pending_reply()
+    assert pending.text == TOO_LONG
+    assert pending.continuation == []
+
+
+@pytest.mark.parametrize(
+    "message,seconds",
+    [
+        ("Take a break for 5 minutes before trying again.", 300),
+        ("Take a break for 9 seconds before trying again.", 9),
+        ("Looks like you've been doing that a lot.", None),
+    ],
+)
+def test_parse_ratelimit(message, seconds):
+    assert parse_ratelimit(message) == seconds
+
+
+def test_posted_chains_continuation(queue, store):
+    queue._posted(store.next_pending_reply(), "t1_reply")
+    assert store.has_replied("t1_a")
+    assert store.reply_count("s") == 1
+    pending = store.next_pending_reply()
+    assert pending.target == "t1_reply"
+    assert pending.submission_id is None
+    assert pending.text == "second"
+
+
+def test_posted_without_reply(queue, store):
+    # PRAW returns None for replies in quarantined subreddits, which are posted nonetheless
+    queue._posted(store.next_pending_reply(), None)
+    assert store.has_replied("t1_a")
+    assert store.next_pending_reply() is None
+
+
+def test_posted_removes_pending_on_failure(queue, store, monkeypatch):
+    def fail(*args):
+        raise RuntimeError
+
+    monkeypatch.setattr(store, "increment_reply_count", fail)
+    with pytest.raises(RuntimeError):
+        queue._posted(store.next_pending_reply(), "t1_reply")
+    assert store.has_replied("t1_a")
+    assert store.next_pending_reply() is None
@@ -0,0 +1,36 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+import pytest
+
+from shard import owns, shard_subreddits
+
+
+@pytest.fixture(autouse=True)
+def subreddits(monkeypatch):
+    monkeypatch.setenv("SUBREDDITS", "yugioh+masterduel+BastionBot+DuelLinks")
+    monkeypatch.delenv("SHARD_COUNT", raising=False)
+    monkeypatch.delenv("SHARD_INDEX", raising=False)
+
+
+def test_unsharded_owns_everything():
+    assert owns("yugioh")
+    assert owns("BASTIONBOT")
+    assert not owns("other")
+    assert shard_subreddits() == "bastionbot+duellinks+masterduel+yugioh"
+
+
+def test_shards_partition(monkeypatch):
+    monkeypatch.setenv("SHARD_COUNT", "3")
+    owned = []
+    for index in range(3):
+        monkeypatch.setenv("SHARD_INDEX", str(index))
+        owned.append({name for name in shard_subreddits().split("+") if name})
+        assert all(owns(name) for name in owned[-1])
+    assert owned == [{"bastionbot", "yugioh"}, {"duellinks"}, {"masterduel"}]
+
+
+def test_invalid_index(monkeypatch):
+    monkeypatch.setenv("SHARD_COUNT", "2")
+    monkeypatch.setenv("SHARD_INDEX", "2")
+    with pytest.raises(ValueError):
+        owns("yugioh")
@@ -0,0 +1,33 @@
+# SPDX-FileCopyrightText: © 2026 Kevin Lu, Luna Brand
+# SPDX-Licence-Identifier: AGPL-3.0-or-later
+from store import Store
+
+
+def test_claim_once(store):
+    assert store.claim("t1_a")
+    assert not store.claim("t1_a")
+    assert store.is_processed("t1_a")
+
+
+def test_claim_after_processed(store):
+    store.mark_processed("t1_a")
+    assert not store.claim("t1_a")
+
+
+def test_claim_after_replied(store):
+    # Recording a reply does not process the item, so it can still be claimed once
+    store.mark_replied("t1_a", "t1_reply")
+    assert store.claim("t1_a")
+    assert not store.claim("t1_a")
+    assert store.has_replied("t1_a")
+
+
+def test_claim_fullnames_are_distinct(store):
+    assert store.claim("t1_a")
+    assert store.claim("t3_a")
+
+
+def test_claim_across_shards(store, tmp_path):
+    other = Store(str(tmp_path / "bastion.sqlite3"))
+    assert other.claim("t1_a")
+    assert not store.claim("t1_a")